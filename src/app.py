@@ -14,7 +14,7 @@ import sys
 sys.path.append(str(Path(__file__).parent))
 
 from components.interpreter import create_interpreter
-from components.query_engine import QueryEngine
+from components.query_engine import QueryEngine, partitioned_dataset_is_current
 from components.visualizer import DataVisualizer
 from components.data_summarizer import DataSummarizer
 
@@ -22,6 +22,9 @@ from components.data_summarizer import DataSummarizer
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Columns the UI displays; the selected parameter is added per query
+RESULT_COLUMNS = ['date', 'latitude', 'longitude', 'float_id', 'pressure']
+
 # Page configuration
 st.set_page_config(
     page_title="FloatChat - ARGO Data Explorer",
@@ -74,13 +77,25 @@ def initialize_components():
         project_root = Path(__file__).parent.parent
         data_path = project_root / "processed_data" / "master_dataset.parquet"
         
+        # Prefer the hive-partitioned dataset when consolidation produced one from
+        # the current master dataset; an older copy would serve outdated rows
+        partitioned_path = project_root / "processed_data" / "master_dataset"
+        if partitioned_path.is_dir():
+            if partitioned_dataset_is_current(str(partitioned_path), str(data_path)):
+                data_path = partitioned_path
+            else:
+                logger.warning(f"Ignoring {partitioned_path}: it was written from another version of {data_path}")
+        
         if not data_path.exists():
             st.error(f"Master dataset not found at {data_path}")
             st.info("Please run the data consolidation script first: `python src/data_consolidation.py`")
             st.stop()
         
-        # Initialize components
-        query_engine = QueryEngine(str(data_path))
+        # Initialize components. A single-file dataset is attached from the shared
+        # dataset server when one runs, else memory-mapped from its Arrow cache, so
+        # every Streamlit process shares one copy of the columns
+        query_engine = QueryEngine(str(data_path), arrow_cache=data_path.is_file(),
+                                   shared_memory=data_path.is_file())
         visualizer = DataVisualizer()
         interpreter = create_interpreter()
         
@@ -130,6 +145,13 @@ def display_example_queries():
     
     st.sidebar.info("💡 Copy any example above and paste it into the search box!")
 
+def get_result_columns(entities):
+    """Columns to fetch for a query: the displayed ones plus its parameter"""
+    columns = list(RESULT_COLUMNS)
+    if entities.parameter and entities.parameter not in columns:
+        columns.append(entities.parameter)
+    return columns
+
 def process_query(query, interpreter, query_engine, visualizer):
     """Process a user query and return results"""
     try:
@@ -141,7 +163,12 @@ def process_query(query, interpreter, query_engine, visualizer):
         
         # Execute query
         with st.spinner("🔍 Searching the data..."):
-            results_df = query_engine.execute_query(entities)
+            results_df = query_engine.execute_query(entities, columns=get_result_columns(entities))
+            
+            if results_df.attrs.get('unresolved_location'):
+                st.info(f"📍 Still looking up '{results_df.attrs['unresolved_location']}'. "
+                        "Please try again in a moment.")
+                return None, None
             
             if results_df.empty:
                 st.warning("No data found matching your query. Try a different location or parameter.")
@@ -162,6 +189,32 @@ def process_query(query, interpreter, query_engine, visualizer):
         logger.error(f"Query processing error: {str(e)}")
         return None, None
 
+def load_more_results(query_engine, visualizer):
+    """Append the next page of the current query to the stored results"""
+    results_df = st.session_state.current_results
+    entities = st.session_state.current_entities
+    
+    with st.spinner("🔍 Loading older results..."):
+        page_df = query_engine.execute_page(entities, cursor=results_df.attrs['next_cursor'],
+                                            columns=get_result_columns(entities))
+        combined_df = pd.concat([results_df, page_df])
+        combined_df.attrs['next_cursor'] = page_df.attrs.get('next_cursor')
+        
+        st.session_state.current_results = combined_df
+        st.session_state.current_fig = visualizer.create_map_visualization(
+            combined_df,
+            parameter=entities.parameter,
+            title=f"Ocean Data: {st.session_state.current_query}"
+        )
+
+def get_parameter_stats(query_engine, visualizer, results_df, entities):
+    """Statistics of the query's parameter, from the aggregate cube when it can answer"""
+    stats = query_engine.get_aggregate_stats(entities)
+    if stats:
+        stats['unit'] = visualizer.parameter_info.get(entities.parameter, {}).get('unit', '')
+        return stats
+    return visualizer.get_summary_stats(results_df, entities.parameter)
+
 def display_results(results_df, fig, entities, query_text):
     """Display query results"""
     # Get component instances for this display
@@ -180,8 +233,17 @@ def display_results(results_df, fig, entities, query_text):
         st.subheader("📈 Summary Statistics")
         
         if entities.parameter and entities.parameter in results_df.columns:
-            stats = visualizer.get_summary_stats(results_df, entities.parameter)
+            stats = get_parameter_stats(query_engine, visualizer, results_df, entities)
             if stats:
+                # Medians from the aggregate cube's digests are approximate; moments alone carry none
+                spread_items = ""
+                if 'median' in stats:
+                    label = "Median (approx.)" if stats.get('approximate') else "Median"
+                    spread_items += f'<div class="stats-item"><span class="stats-value">{label}:</span> {stats["median"]:.2f} {stats["unit"]}</div>'
+                if 'percentiles' in stats:
+                    spread_items += (f'<div class="stats-item"><span class="stats-value">5th-95th Percentile:</span> '
+                                     f'{stats["percentiles"][5]:.2f} - {stats["percentiles"][95]:.2f} {stats["unit"]}</div>')
+                
                 st.markdown(f"""
                 <div class="stats-box">
                     <div class="stats-title">{entities.parameter.title()} Statistics</div>
@@ -189,7 +251,7 @@ def display_results(results_df, fig, entities, query_text):
                     <div class="stats-item"><span class="stats-value">Mean:</span> {stats['mean']:.2f} {stats['unit']}</div>
                     <div class="stats-item"><span class="stats-value">Std Dev:</span> {stats['std']:.2f} {stats['unit']}</div>
                     <div class="stats-item"><span class="stats-value">Range:</span> {stats['min']:.2f} - {stats['max']:.2f} {stats['unit']}</div>
-                    <div class="stats-item"><span class="stats-value">Median:</span> {stats['median']:.2f} {stats['unit']}</div>
+                    {spread_items}
                 </div>
                 """, unsafe_allow_html=True)
         
@@ -228,7 +290,7 @@ def display_results(results_df, fig, entities, query_text):
         # Get stats if parameter is available
         stats = None
         if entities.parameter and entities.parameter in results_df.columns:
-            stats = visualizer.get_summary_stats(results_df, entities.parameter)
+            stats = get_parameter_stats(query_engine, visualizer, results_df, entities)
         
         # Use LLM only if enabled and create fast/slow options
         if use_llm:
@@ -377,6 +439,12 @@ def main():
             st.session_state.current_entities,
             st.session_state.current_query
         )
+        
+        # Results arrive a page at a time, newest first
+        next_cursor = st.session_state.current_results.attrs.get('next_cursor')
+        if next_cursor is not None and st.button("⬇️ Load older results", key="load_more"):
+            load_more_results(query_engine, visualizer)
+            st.rerun()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,199 @@
+"""
+Aggregate Cube for FloatChat
+Precomputed per-parameter moments and t-digests by grid cell, month and pressure band.
+"""
+
+import pandas as pd
+import numpy as np
+import pyarrow.parquet as pq
+import json
+import logging
+import math
+import os
+from typing import Callable, Dict, Optional, Tuple
+from .regions import CELL_INSIDE, longitude_ranges
+from .sketches import merge_moments, moments_of
+
+logger = logging.getLogger(__name__)
+
+# Schema metadata written by data_consolidation.build_aggregate_cube
+CUBE_METADATA_KEY = b'floatchat.aggregate_cube'
+
+class AggregateCube:
+    """Moments and t-digests of every parameter by lat/lon cell, month and pressure band"""
+    
+    def __init__(self, cube_path: str):
+        """
+        Load the cube; it is small enough to keep resident.
+        
+        Args:
+            cube_path: Path to aggregate_cube.parquet
+        """
+        self.cube_path = cube_path
+        table = pq.read_table(cube_path)
+        metadata = json.loads(table.schema.metadata[CUBE_METADATA_KEY])
+        
+        self.cell_degrees = float(metadata['cell_degrees'])
+        self.pressure_edges = [-math.inf] + [float(edge) for edge in metadata['pressure_edges']] + [math.inf]
+        self.source_rows = metadata['source_rows']
+        # Cubes written before the signature was recorded never match a dataset
+        self.source_signature = metadata.get('source_signature')
+        
+        # Digests stay flat: centroids of cell i are centroid_*[offsets[i]:offsets[i + 1]]
+        self.centroid_offsets, self.centroid_means, self.centroid_weights = None, None, None
+        if 'centroid_means' in table.column_names:
+            means = table.column('centroid_means').combine_chunks()
+            self.centroid_offsets = means.offsets.to_numpy()
+            self.centroid_means = means.values.to_numpy()
+            self.centroid_weights = table.column('centroid_weights').combine_chunks().values.to_numpy()
+            table = table.drop_columns(['centroid_means', 'centroid_weights'])
+        
+        cube = table.to_pandas()
+        cube['row'] = np.arange(len(cube))
+        self.cells: Dict[str, Dict[str, np.ndarray]] = {
+            parameter: {column: group[column].to_numpy() for column in group.columns if column != 'parameter'}
+            for parameter, group in cube.groupby('parameter')
+        }
+        
+        logger.info(f"Loaded aggregate cube with {len(cube)} cells for {sorted(self.cells)} "
+                    f"({self.cell_degrees:g}° cells, {len(self.pressure_edges) - 1} pressure bands)")
+    
+    @classmethod
+    def open(cls, cube_path: str) -> Optional['AggregateCube']:
+        """Open an aggregate cube if the file exists, logging instead of raising"""
+        if not cube_path or not os.path.exists(cube_path):
+            return None
+        
+        try:
+            return cls(cube_path)
+        except Exception as e:
+            logger.error(f"Failed to open aggregate cube {cube_path}: {str(e)}")
+            return None
+    
+    def whole_cell_test(self, bounds: Dict[str, float]) -> Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]]:
+        """
+        Test for positions lying in cube cells wholly inside a query area.
+        
+        For a box these are the cells of the largest grid-aligned box within
+        it; for a polygon region, the grid cells Region.classify_cells finds
+        inside it. The test holds for a row exactly when it holds for the
+        midpoint of the row's cube cell, so the cells passing it and the rows
+        failing it split the area's rows without overlap: the former are
+        answered from the cube, the latter (the edge cells) from raw rows.
+        
+        Args:
+            bounds: Box with lat_min/lat_max/lon_min/lon_max, and 'region' for polygons
+        
+        Returns:
+            Function (latitude, longitude) -> boolean mask, or None if the
+            cube's grid does not line up with the region cell grid
+        """
+        degrees = self.cell_degrees
+        
+        if 'region' in bounds:
+            # Region cells count from -90/-180, cube cells from 0
+            if not (self._on_grid(90.0) and self._on_grid(180.0)):
+                return None
+            n_lat, n_lon = int(round(180.0 / degrees)), int(round(360.0 / degrees))
+            lat_start, lon_start, classes = bounds['region'].classify_cells(degrees)
+            lat_cells, lon_cells = np.nonzero(classes == CELL_INSIDE)
+            lat_cells = lat_cells + lat_start
+            lon_cells = (lon_cells + lon_start) % n_lon
+            in_grid = (lat_cells >= 0) & (lat_cells < n_lat)
+            inside = np.zeros((n_lat, n_lon), dtype=bool)
+            inside[lat_cells[in_grid], lon_cells[in_grid]] = True
+            
+            def test(latitude, longitude):
+                lat_cell = np.floor((np.asarray(latitude, dtype=np.float64) + 90.0) / degrees)
+                lon_cell = np.floor((np.asarray(longitude, dtype=np.float64) + 180.0) / degrees)
+                valid = (lat_cell >= 0) & (lat_cell < n_lat) & (lon_cell >= 0) & (lon_cell < n_lon)
+                result = np.zeros(lat_cell.shape, dtype=bool)
+                result[valid] = inside[lat_cell[valid].astype(np.int64), lon_cell[valid].astype(np.int64)]
+                return result
+            return test
+        
+        def inner(low, high):
+            return math.ceil(low / degrees - 1e-9) * degrees, math.floor(high / degrees + 1e-9) * degrees
+        
+        lat_low, lat_high = inner(bounds['lat_min'], bounds['lat_max'])
+        lon_ranges = [inner(low, high) for low, high in longitude_ranges(bounds['lon_min'], bounds['lon_max'])]
+        
+        def test(latitude, longitude):
+            latitude, longitude = np.asarray(latitude), np.asarray(longitude)
+            in_lon = np.zeros(longitude.shape, dtype=bool)
+            for low, high in lon_ranges:
+                in_lon |= (longitude >= low) & (longitude <= high)
+            return (latitude >= lat_low) & (latitude <= lat_high) & in_lon
+        return test
+    
+    def _on_grid(self, value: float) -> bool:
+        steps = value / self.cell_degrees
+        return abs(steps - round(steps)) < 1e-9
+    
+    def _digest(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Concatenated digest centroids of the given cube rows"""
+        starts = self.centroid_offsets[rows]
+        lengths = self.centroid_offsets[rows + 1] - starts
+        
+        # Concatenated aranges: each row's run of centroids, without a Python loop
+        run_starts = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        positions = run_starts + np.arange(lengths.sum())
+        return self.centroid_means[positions], self.centroid_weights[positions]
+    
+    def aggregate(self, parameter: str, covered: Callable[[np.ndarray, np.ndarray], np.ndarray] = None,
+                  depth_bounds: Tuple[float, float] = None,
+                  months: Tuple[pd.Timestamp, pd.Timestamp] = None) -> Optional[Dict]:
+        """
+        Merge the moments of the cube cells a request covers.
+        
+        The request fits when its depth bounds lie on band edges; values
+        lying exactly on an edge have cells of their own, so the inclusive
+        bounds are covered exactly. Rows without a pressure are only counted
+        without depth bounds.
+        
+        Args:
+            parameter: Parameter name
+            covered: whole_cell_test of the query area (None for everywhere)
+            depth_bounds: (min, max) pressure (None for all depths)
+            months: [first, stop) range of month starts (None for all months)
+        
+        Returns:
+            Merged moments (with the merged t-digest under 'digest' when the
+            cube has digests), or None if the parameter is missing or the
+            request does not fit the cube's bands
+        """
+        cells = self.cells.get(parameter)
+        if cells is None:
+            return None
+        
+        mask = np.ones(len(cells['count']), dtype=bool)
+        
+        if covered is not None:
+            mask &= covered((cells['lat_min'] + cells['lat_max']) / 2, (cells['lon_min'] + cells['lon_max']) / 2)
+        
+        if depth_bounds is not None:
+            min_depth, max_depth = float(depth_bounds[0]), float(depth_bounds[1])
+            if min_depth not in self.pressure_edges or max_depth not in self.pressure_edges:
+                return None
+            mask &= (cells['pressure_min'] >= min_depth) & (cells['pressure_max'] <= max_depth)
+        
+        if months is not None:
+            first, stop = np.datetime64(months[0], 'ns'), np.datetime64(months[1], 'ns')
+            mask &= (cells['month'] >= first) & (cells['month'] < stop)
+        
+        digests = self.centroid_offsets is not None
+        if not mask.any():
+            return moments_of(np.empty(0), digest=digests)
+        
+        moments = {
+            'count': int(cells['count'][mask].sum()),
+            'sum': float(cells['sum'][mask].sum()),
+            'sumsq': float(cells['sumsq'][mask].sum()),
+            'min': float(cells['min'][mask].min()),
+            'max': float(cells['max'][mask].max()),
+        }
+        if digests:
+            # O(cells) merge: the selected cells' centroids are recompressed into one digest
+            moments['digest'] = self._digest(cells['row'][mask])
+            moments = merge_moments([moments])
+        return moments
@@ -0,0 +1,243 @@
+"""
+Geocoding support for FloatChat
+Persistent geocode cache and offline gazetteer used by the query engine.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional, Tuple
+from geopy.exc import GeopyError
+from .regions import Region
+
+logger = logging.getLogger(__name__)
+
+# Bundled gazetteer of ocean basins, seas and coastal features
+DEFAULT_GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer.json')
+
+# Names the geocoder did not know are retried after this many seconds
+NEGATIVE_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+# Time a query waits for the geocoder before answering "unresolved location"
+GEOCODE_BUDGET_SECONDS = 1.5
+GEOCODE_TIMEOUT_SECONDS = 10
+GEOCODE_WORKERS = 2
+
+# Failed lookups (timeouts, service errors) are not cached but retried after this delay
+GEOCODE_RETRY_SECONDS = 60
+
+# Half-size in degrees of the box built around a geocoded point
+GEOCODE_BOX_DEGREES = 2
+
+BOUND_KEYS = ('lat_min', 'lat_max', 'lon_min', 'lon_max')
+
+def normalize_location(location: str) -> str:
+    """Canonical lookup key for a location name"""
+    return ' '.join(location.lower().split())
+
+def load_gazetteer(path: str = DEFAULT_GAZETTEER_PATH) -> Dict[str, Dict[str, float]]:
+    """
+    Load named bounding boxes from a JSON gazetteer.
+    
+    Args:
+        path: JSON file mapping names to lat_min/lat_max/lon_min/lon_max, or
+            to a 'polygons' list of [lon, lat] rings (even-odd rule); an
+            'aliases' entry may map alternative names to canonical ones
+    
+    Returns:
+        Dictionary of normalized name to bounds, empty if the file is missing.
+        Polygon entries carry their bounding box plus the Region under 'region'
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    
+    try:
+        with open(path) as f:
+            entries = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to load gazetteer {path}: {str(e)}")
+        return {}
+    
+    aliases = entries.pop('aliases', {})
+    gazetteer = {}
+    for name, entry in entries.items():
+        if 'polygons' in entry:
+            region = Region(name, entry['polygons'])
+            gazetteer[normalize_location(name)] = {**region.bounds, 'region': region}
+        elif all(key in entry for key in BOUND_KEYS):
+            gazetteer[normalize_location(name)] = {key: float(entry[key]) for key in BOUND_KEYS}
+    for alias, name in aliases.items():
+        if normalize_location(name) in gazetteer:
+            gazetteer[normalize_location(alias)] = gazetteer[normalize_location(name)]
+    
+    logger.info(f"Loaded {len(gazetteer)} gazetteer entries from {path}")
+    return gazetteer
+
+class GeocodeCache:
+    """Geocoding results persisted as JSON, including misses"""
+    
+    def __init__(self, cache_path: str, negative_ttl: float = NEGATIVE_CACHE_TTL_SECONDS):
+        """
+        Open (or start) a geocode cache file.
+        
+        Args:
+            cache_path: JSON file holding cached lookups
+            negative_ttl: Seconds before a name the geocoder did not know is retried
+        """
+        self.cache_path = cache_path
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict] = {}
+        
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path) as f:
+                    self.entries = json.load(f)
+                logger.info(f"Loaded {len(self.entries)} cached geocodes from {cache_path}")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable geocode cache {cache_path}: {str(e)}")
+    
+    def get(self, location: str) -> Tuple[bool, Optional[Dict[str, float]]]:
+        """
+        Look up a location.
+        
+        Returns:
+            (found, bounds): found is False when the geocoder has to be asked;
+            bounds is None for a cached miss
+        """
+        with self._lock:
+            entry = self.entries.get(normalize_location(location))
+        
+        if entry is None:
+            return False, None
+        if entry['bounds'] is None and time.time() - entry['time'] > self.negative_ttl:
+            return False, None
+        return True, entry['bounds']
+    
+    def put(self, location: str, bounds: Optional[Dict[str, float]]):
+        """Record a lookup result (None for a miss) and persist the cache"""
+        with self._lock:
+            self.entries[normalize_location(location)] = {'bounds': bounds, 'time': time.time()}
+            self._save()
+    
+    def _save(self):
+        if not self.cache_path:
+            return
+        
+        try:
+            directory = os.path.dirname(os.path.abspath(self.cache_path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Failed to save geocode cache {self.cache_path}: {str(e)}")
+
+class BackgroundGeocoder:
+    """Runs geocoder lookups on worker threads so queries wait at most a fixed budget"""
+    
+    def __init__(self, geocoder, cache: GeocodeCache, budget_seconds: float = GEOCODE_BUDGET_SECONDS,
+                 timeout_seconds: float = GEOCODE_TIMEOUT_SECONDS, workers: int = GEOCODE_WORKERS):
+        """
+        Args:
+            geocoder: geopy geocoder (e.g. Nominatim)
+            cache: Cache that receives every completed lookup
+            budget_seconds: How long resolve() waits before giving up for this query
+            timeout_seconds: Network timeout of the lookup itself
+            workers: Number of concurrent lookups
+        """
+        self.geocoder = geocoder
+        self.cache = cache
+        self.budget_seconds = budget_seconds
+        self.timeout_seconds = timeout_seconds
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='geocode')
+        self.pending = {}
+        self.failures = {}
+        self._lock = threading.Lock()
+    
+    def _lookup(self, location: str) -> Tuple[bool, Optional[Dict[str, float]]]:
+        """
+        Query the geocoder and record the outcome in the cache.
+        
+        Returns:
+            (resolved, bounds): resolved is False when the lookup failed and
+            is to be retried; bounds is None for a name the geocoder does not know
+        """
+        try:
+            logger.info(f"Geocoding location: {location}")
+            location_data = self.geocoder.geocode(location, exactly_one=True, timeout=self.timeout_seconds)
+            
+            if location_data:
+                lat, lon = location_data.latitude, location_data.longitude
+                
+                # Create a bounding box around the point
+                bounds = {
+                    'lat_min': lat - GEOCODE_BOX_DEGREES,
+                    'lat_max': lat + GEOCODE_BOX_DEGREES,
+                    'lon_min': lon - GEOCODE_BOX_DEGREES,
+                    'lon_max': lon + GEOCODE_BOX_DEGREES
+                }
+                
+                logger.info(f"Geocoded {location} to bounds: {bounds}")
+                self.cache.put(location, bounds)
+                return True, bounds
+            
+            # Remember misses so unknown names do not hit the network on every query
+            logger.info(f"Geocoder does not know {location}")
+            self.cache.put(location, None)
+            return True, None
+        
+        except GeopyError as e:
+            logger.warning(f"Geocoding failed for {location}: {str(e)}")
+            with self._lock:
+                self.failures[normalize_location(location)] = time.monotonic()
+            return False, None
+    
+    def _finished(self, key: str):
+        with self._lock:
+            self.pending.pop(key, None)
+    
+    def resolve(self, location: str, budget_seconds: float = None) -> Tuple[bool, Optional[Dict[str, float]]]:
+        """
+        Look up a location, waiting at most the latency budget.
+        
+        A lookup that outlives the budget keeps running in the background and
+        fills the cache for the next query; concurrent queries for the same
+        name share one lookup.
+        
+        Args:
+            location: Location name
+            budget_seconds: Override of the default budget
+        
+        Returns:
+            (resolved, bounds): resolved is False while the lookup is still
+            running, and until the retry after a failed lookup
+        """
+        key = normalize_location(location)
+        with self._lock:
+            failed_at = self.failures.get(key)
+            if failed_at is not None and time.monotonic() - failed_at < GEOCODE_RETRY_SECONDS:
+                return False, None
+            
+            future = self.pending.get(key)
+            if future is None:
+                future = self.executor.submit(self._lookup, location)
+                self.pending[key] = future
+                future.add_done_callback(lambda _: self._finished(key))
+        
+        budget = self.budget_seconds if budget_seconds is None else budget_seconds
+        try:
+            return future.result(timeout=budget)
+        except FutureTimeoutError:
+            logger.warning(f"Geocoding {location} exceeded the {budget:g}s budget, continuing in the background")
+            return False, None
+    
+    def is_pending(self, location: str) -> bool:
+        """True while a background lookup for this location is running"""
+        with self._lock:
+            return normalize_location(location) in self.pending
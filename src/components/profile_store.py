@@ -0,0 +1,140 @@
+"""
+Profile Store for FloatChat
+Indexed access to whole vertical profiles packed by data consolidation.
+"""
+
+import pandas as pd
+import numpy as np
+import pyarrow.parquet as pq
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Metadata columns repeated on every level of a returned profile
+PROFILE_METADATA_COLUMNS = ['float_id', 'profile_id', 'date', 'latitude', 'longitude', 'direction', 'data_mode']
+
+class ProfileStore:
+    """Key index over profile_store.parquet (one row per float profile)"""
+    
+    def __init__(self, store_path: str):
+        """
+        Open the profile store and index its keys.
+        
+        Only the float_id and profile_id columns are read here; profile data is
+        fetched on demand from the single row group that holds it.
+        
+        Args:
+            store_path: Path to profile_store.parquet
+        """
+        self.store_path = store_path
+        self.parquet_file = pq.ParquetFile(store_path)
+        
+        metadata = self.parquet_file.metadata
+        row_group_sizes = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+        self.row_group_starts = np.cumsum([0] + row_group_sizes)
+        
+        keys = self.parquet_file.read(columns=['float_id', 'profile_id'])
+        float_ids = keys.column('float_id').cast('string').to_pylist()
+        profile_ids = keys.column('profile_id').to_numpy()
+        
+        self.index: Dict[Tuple[str, int], int] = {
+            (float_id, int(profile_id)): row
+            for row, (float_id, profile_id) in enumerate(zip(float_ids, profile_ids))
+        }
+        
+        # Profiles of a float are contiguous because the store is sorted by key
+        self.float_ranges: Dict[str, Tuple[int, int]] = {}
+        for row, float_id in enumerate(float_ids):
+            start, _ = self.float_ranges.get(float_id, (row, row))
+            self.float_ranges[float_id] = (start, row + 1)
+        
+        logger.info(f"Indexed profile store with {len(self.index)} profiles "
+                    f"from {len(self.float_ranges)} floats")
+    
+    @classmethod
+    def open(cls, store_path: str) -> Optional['ProfileStore']:
+        """Open a profile store if the file exists, logging instead of raising"""
+        if not store_path or not os.path.exists(store_path):
+            return None
+        
+        try:
+            return cls(store_path)
+        except Exception as e:
+            logger.error(f"Failed to open profile store {store_path}: {str(e)}")
+            return None
+    
+    def _read_rows(self, start: int, stop: int):
+        """Read global rows [start, stop) touching only the row groups that hold them"""
+        first_group = int(np.searchsorted(self.row_group_starts, start, side='right')) - 1
+        last_group = int(np.searchsorted(self.row_group_starts, stop - 1, side='right')) - 1
+        
+        table = self.parquet_file.read_row_groups(list(range(first_group, last_group + 1)))
+        return table.slice(start - self.row_group_starts[first_group], stop - start)
+    
+    def _explode(self, table) -> pd.DataFrame:
+        """Turn packed profile rows into one DataFrame row per level"""
+        profiles = table.to_pandas()
+        if profiles.empty:
+            return pd.DataFrame()
+        
+        level_columns = [
+            name for name, field in zip(table.schema.names, table.schema.types)
+            if str(field).startswith('list')
+        ]
+        qc_columns = [name for name in table.schema.names if name.endswith('_qc') and name != 'position_qc']
+        n_levels = profiles['n_levels'].to_numpy(dtype=np.int64)
+        
+        levels = {
+            column: np.repeat(profiles[column].to_numpy(), n_levels)
+            for column in PROFILE_METADATA_COLUMNS if column in profiles
+        }
+        levels['level_index'] = np.concatenate([np.arange(n) for n in n_levels])
+        for column in level_columns:
+            levels[column] = np.concatenate(profiles[column].to_numpy())
+        for column in qc_columns:
+            levels[column] = list(''.join(profiles[column].fillna('')))
+        
+        return pd.DataFrame(levels)
+    
+    def get_profile(self, float_id: str, profile_id: int) -> pd.DataFrame:
+        """
+        Fetch one whole vertical profile.
+        
+        Args:
+            float_id: Float identifier (WMO number)
+            profile_id: Profile (cycle) number, as in the master dataset
+        
+        Returns:
+            DataFrame with one row per level, empty if the profile is unknown
+        """
+        row = self.index.get((str(float_id), int(profile_id)))
+        if row is None:
+            logger.warning(f"Profile {profile_id} of float {float_id} not found in profile store")
+            return pd.DataFrame()
+        
+        return self._explode(self._read_rows(row, row + 1))
+    
+    def get_float_profiles(self, float_id: str, profile_ids: List[int] = None) -> pd.DataFrame:
+        """
+        Fetch all (or selected) profiles of a float in one contiguous read.
+        
+        Args:
+            float_id: Float identifier (WMO number)
+            profile_ids: Optional subset of profile numbers
+        
+        Returns:
+            DataFrame with one row per level of the selected profiles
+        """
+        row_range = self.float_ranges.get(str(float_id))
+        if row_range is None:
+            logger.warning(f"Float {float_id} not found in profile store")
+            return pd.DataFrame()
+        
+        table = self._read_rows(*row_range)
+        if profile_ids is not None:
+            wanted = np.isin(table.column('profile_id').to_numpy(), np.asarray(profile_ids))
+            table = table.filter(wanted)
+        
+        return self._explode(table)
@@ -4,27 +4,147 @@ Handles data filtering, geocoding, and location-based queries.
 """
 
 import pandas as pd
+import copy
+import json
 import logging
-from typing import Dict, List, Tuple, Optional
+import math
+import os
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import threading
+from typing import Any, Dict, List, Tuple, Optional
 from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
 import numpy as np
 from datetime import datetime, timedelta
+from .profile_store import ProfileStore
+from .aggregate_cube import AggregateCube
+from .sketches import merge_moments, moments_of, moments_to_stats
+from .spatial_index import SpatialGridIndex
+from .result_cache import ResultCache
+from .shared_dataset import SharedDataset, get_manifest_path
+from .table_lock import TableLock
+from .regions import longitude_mask, longitude_ranges
+from .geocoding import DEFAULT_GAZETTEER_PATH, BackgroundGeocoder, GeocodeCache, load_gazetteer, normalize_location
 
 logger = logging.getLogger(__name__)
 
+# Hive partition keys written by data_consolidation.write_partitioned_dataset
+PARTITION_COLUMNS = ['year', 'month', 'lat_cell', 'lon_cell']
+PARTITION_METADATA_KEY = b'floatchat.partition_cell_degrees'
+DEFAULT_PARTITION_CELL_DEGREES = 10
+
+# Signature of the consolidated file a partitioned dataset was written from
+PARTITION_SOURCE_KEY = b'floatchat.source_signature'
+
+# Compact dtypes of the master dataset storage schema (see data_consolidation.STORAGE_TYPES)
+STORAGE_DTYPES = {
+    'profile_id': 'int32',
+    'latitude': 'float32',
+    'longitude': 'float32',
+    'pressure': 'float32',
+    'temperature': 'float32',
+    'salinity': 'float32',
+}
+STORAGE_DROP_COLUMNS = ['index']
+
+# Uncompressed Arrow IPC copy of the resident table, memory-mapped on load
+ARROW_CACHE_SUFFIX = '.arrow'
+ARROW_CACHE_SOURCE_KEY = b'floatchat.source_signature'
+
+# Cell size of the spatial grid index built over the resident table
+SPATIAL_INDEX_CELL_DEGREES = 1.0
+
+# Rows evaluated per pass of the fused filter kernel
+FUSED_CHUNK_ROWS = 1 << 20
+
+# Rows per result page returned by execute_query / execute_page (newest first)
+RESULT_PAGE_SIZE = 10000
+
+# Query result cache budget and entry lifetime
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+RESULT_CACHE_TTL_SECONDS = 600
+
+# Half-width of the window used for single-date queries
+DATE_WINDOW_DAYS = 30
+
+def read_partition_source_signature(partition_dir: str) -> Optional[List[int]]:
+    """Signature of the consolidated file a partitioned dataset was written from, or None if unknown"""
+    try:
+        metadata = pq.read_schema(os.path.join(partition_dir, '_common_metadata')).metadata or {}
+        return json.loads(metadata[PARTITION_SOURCE_KEY])
+    except (OSError, KeyError, ValueError, pa.ArrowInvalid):
+        return None
+
+def partitioned_dataset_is_current(partition_dir: str, source_path: str) -> bool:
+    """True if the partitioned dataset was written from the current version of source_path"""
+    try:
+        stat = os.stat(source_path)
+    except OSError:
+        return False
+    return read_partition_source_signature(partition_dir) == [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
 class QueryEngine:
     """Data filtering and query processing engine"""
     
-    def __init__(self, data_path: str):
+    def __init__(self, data_path: str, lazy: bool = False, profile_store_path: str = None, fused: bool = True,
+                 cache_max_bytes: int = RESULT_CACHE_MAX_BYTES, cache_ttl: float = RESULT_CACHE_TTL_SECONDS,
+                 gazetteer_path: str = DEFAULT_GAZETTEER_PATH, geocode_cache_path: str = None,
+                 geocode_budget: float = None, arrow_cache: bool = False, shared_memory: bool = False,
+                 aggregate_cube_path: str = None):
         """
         Initialize the query engine with the master dataset.
         
         Args:
-            data_path: Path to the master_dataset.parquet file
+            data_path: Path to the master_dataset.parquet file, or to a
+                hive-partitioned dataset directory written by consolidation
+            lazy: Keep nothing resident and push every query down to the
+                parquet reader (always the case for partitioned datasets)
+            profile_store_path: Path to profile_store.parquet (default: next
+                to the master dataset, if present)
+            fused: Evaluate all filters of a query in one pass over the
+                resident table instead of one filter_by_* step at a time
+            cache_max_bytes: Memory budget of the query result cache (0 disables it)
+            cache_ttl: Seconds a cached result stays valid
+            gazetteer_path: JSON gazetteer of named regions loaded at startup
+                (None to use only the built-in regions)
+            geocode_cache_path: Persistent geocode cache (default:
+                geocode_cache.json next to the master dataset)
+            geocode_budget: Seconds a query waits for the geocoder before it
+                is answered as an unresolved location (default 1.5)
+            arrow_cache: Keep an uncompressed Arrow IPC copy of the dataset
+                next to the parquet file and memory-map it on load, so startup
+                skips parquet decoding and worker processes share the pages
+            shared_memory: Attach read-only to the columns published by the
+                shared dataset server (components/shared_dataset.py) instead of
+                loading a private copy; loads normally when no server runs
+            aggregate_cube_path: Path to aggregate_cube.parquet (default: next
+                to the master dataset, if present)
         """
         self.data_path = data_path
+        self.lazy = lazy
+        self.fused = fused
+        self.arrow_cache = arrow_cache
+        self.shared_memory = shared_memory
+        self.shared_dataset = None
         self.data = None
+        self.dataset = None
+        self.spatial_index = None
+        self.sorted_dates = None
+        self.partition_cell_degrees = DEFAULT_PARTITION_CELL_DEGREES
+        self._dataset_summary = None
+        self.data_signature = None
+        self.failed_signature = None
+        self.manifest_signature = None
+        self.aggregate_cube = None
+        self.result_cache = ResultCache(cache_max_bytes, cache_ttl) if cache_max_bytes else None
+        
+        # Streamlit sessions share one engine across threads: queries hold the table
+        # lock shared, a reload swaps its new table in exclusively, and only one
+        # thread at a time builds a reload
+        self.table_lock = TableLock()
+        self._reload_lock = threading.Lock()
         self.geocoder = Nominatim(user_agent="floatchat-v1.0")
         
         # Predefined bounding boxes for common ocean regions
@@ -39,61 +159,687 @@ class QueryEngine:
             'sri lanka': {'lat_min': 5, 'lat_max': 10, 'lon_min': 79, 'lon_max': 82},
         }
         
+        # Offline gazetteer entries extend the regions above; polygon outlines
+        # also replace the built-in box of the same region
+        for name, bounds in load_gazetteer(gazetteer_path).items():
+            if name not in self.location_bounds or 'region' in bounds:
+                self.location_bounds[name] = bounds
+        
+        data_dir = os.path.dirname(os.path.abspath(data_path))
+        if geocode_cache_path is None:
+            geocode_cache_path = os.path.join(data_dir, 'geocode_cache.json')
+        self.geocode_cache = GeocodeCache(geocode_cache_path)
+        self.background_geocoder = BackgroundGeocoder(self.geocoder, self.geocode_cache)
+        if geocode_budget is not None:
+            self.background_geocoder.budget_seconds = geocode_budget
+        
+        if aggregate_cube_path is None:
+            aggregate_cube_path = os.path.join(data_dir, 'aggregate_cube.parquet')
+        self.aggregate_cube_path = aggregate_cube_path
+        
         self.load_data()
+        
+        if profile_store_path is None:
+            profile_store_path = os.path.join(data_dir, 'profile_store.parquet')
+        self.profile_store = ProfileStore.open(profile_store_path)
     
     def load_data(self):
         """Load the master dataset"""
+        self.install_state(self.load_state())
+    
+    def load_state(self, shared_only: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Load the dataset, its indexes and its aggregate cube without touching the engine.
+        
+        Args:
+            shared_only: Only attach to the shared dataset; give up instead of
+                loading a private copy
+        
+        Returns:
+            Engine attributes describing the loaded dataset, for install_state
+            (None when shared_only and nothing matching is published)
+        """
+        signature = self.get_data_signature()
+        state = {
+            'data_signature': signature,
+            'data': None,
+            'dataset': None,
+            'sorted_dates': None,
+            'spatial_index': None,
+            'shared_dataset': None,
+            'manifest_signature': None,
+            'partition_cell_degrees': DEFAULT_PARTITION_CELL_DEGREES,
+            '_dataset_summary': None,
+        }
+        
+        if self.lazy or os.path.isdir(self.data_path):
+            state['dataset'], state['partition_cell_degrees'] = self.open_dataset()
+        else:
+            try:
+                data, spatial_index = None, None
+                if self.shared_memory:
+                    # Recorded before attaching, so a manifest republished meanwhile is retried
+                    state['manifest_signature'] = self.get_manifest_signature()
+                    state['shared_dataset'] = self.attach_shared_dataset(signature)
+                    if state['shared_dataset'] is not None:
+                        data = state['shared_dataset'].to_frame()
+                        spatial_index = state['shared_dataset'].to_spatial_index(SPATIAL_INDEX_CELL_DEGREES)
+                if data is None and shared_only:
+                    return None
+                if data is None and self.arrow_cache:
+                    data = self.read_arrow_cache(signature)
+                if data is None:
+                    data = self.apply_storage_dtypes(pd.read_parquet(self.data_path))
+                    logger.info(f"Loaded dataset with {len(data)} records "
+                                f"({data.memory_usage(deep=True).sum() / (1024*1024):.1f} MB resident)")
+                    if self.arrow_cache:
+                        data = self.write_arrow_cache(data, signature)
+                
+                state.update(self.build_indexes(data, spatial_index))
+                
+            except Exception as e:
+                logger.error(f"Failed to load data from {self.data_path}: {str(e)}")
+                raise
+        
+        state['aggregate_cube'] = self.open_aggregate_cube(self.get_source_signature(signature))
+        return state
+    
+    def install_state(self, state: Dict[str, Any]):
+        """Swap a loaded dataset in at once, after the queries running on the previous one finish"""
+        with self.table_lock.exclusive():
+            for name, value in state.items():
+                setattr(self, name, value)
+            
+            # Results of the previous dataset must not outlive it
+            if self.result_cache is not None:
+                self.result_cache.clear()
+    
+    def get_data_signature(self) -> Optional[Tuple]:
+        """Identity of the dataset on disk; consolidation replaces files atomically, so it changes on rewrite"""
+        paths = [self.data_path]
+        if os.path.isdir(self.data_path):
+            paths.append(os.path.join(self.data_path, '_common_metadata'))
+        
+        signature = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+    
+    def get_manifest_signature(self) -> Optional[Tuple]:
+        """Identity of the shared dataset manifest; the server replaces it whenever it republishes"""
+        try:
+            stat = os.stat(get_manifest_path(self.data_path))
+            return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            return None
+    
+    def dataset_changed(self, signature: Tuple) -> bool:
+        """True if the dataset on disk is neither the loaded version nor one that failed to load"""
+        return signature not in (self.data_signature, self.failed_signature) and signature[0] is not None
+    
+    def shared_dataset_pending(self) -> bool:
+        """True if a private copy is resident and the shared dataset was republished since the last attach"""
+        return (self.shared_memory and self.shared_dataset is None and self.data is not None
+                and self.get_manifest_signature() != self.manifest_signature)
+    
+    def refresh_if_changed(self):
+        """
+        Reload the dataset and drop cached results when the file on disk changed.
+        
+        The new table, indexes and cube are built while other threads keep
+        querying the current ones, then swapped in together. Must not be
+        called while holding the table lock. An engine that fell back to a
+        private copy (the server had not republished yet) switches to the
+        shared dataset once the server publishes the loaded version.
+        """
+        signature = self.get_data_signature()
+        if not (self.dataset_changed(signature) or self.shared_dataset_pending()):
+            return
+        
+        # One thread reloads; the others keep answering from the current table meanwhile
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            signature = self.get_data_signature()
+            if self.dataset_changed(signature):
+                logger.info(f"Dataset {self.data_path} changed on disk, reloading and clearing the result cache")
+                try:
+                    state = self.load_state()
+                except Exception as e:
+                    logger.error(f"Keeping the loaded dataset, reload of {self.data_path} failed: {str(e)}")
+                    self.failed_signature = signature
+                    return
+            elif self.shared_dataset_pending():
+                manifest_signature = self.get_manifest_signature()
+                try:
+                    state = self.load_state(shared_only=True)
+                except Exception as e:
+                    logger.error(f"Keeping the private copy, attaching to the shared dataset failed: {str(e)}")
+                    state = None
+                if state is None:
+                    # Retried once the server publishes again
+                    self.manifest_signature = manifest_signature
+                    return
+                logger.info(f"Switching from the private copy to the shared dataset of {self.data_path}")
+            else:
+                return
+            self.install_state(state)
+        finally:
+            self._reload_lock.release()
+    
+    def cache_key(self, entities) -> Tuple:
+        """
+        Canonical form of a query, so equivalent entities share a cache entry.
+        
+        Dates and depths are resolved to the bounds the filters would use;
+        values that do not parse are kept as given.
+        
+        Args:
+            entities: QueryEntity object with extracted parameters
+        
+        Returns:
+            Hashable key
+        """
+        try:
+            window = self.get_date_window(date=entities.date, date_range=entities.date_range)
+            dates = tuple(value.isoformat() for value in window) if window else None
+        except Exception:
+            dates = ('unparsed', repr(entities.date), repr(entities.date_range))
+        
+        try:
+            depths = tuple(float(value) for value in self.get_depth_bounds(entities.depth_range)) if entities.depth_range else None
+        except Exception:
+            depths = ('unparsed', repr(entities.depth_range))
+        
+        location = entities.location.lower() if entities.location else None
+        return (entities.parameter or None, location, dates, depths)
+    
+    def apply_storage_dtypes(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Keep the resident table in the compact storage schema.
+        
+        Files written by current consolidation already match it; older files
+        (float64 columns, object float ids, merge index column) are downcast.
+        
+        Args:
+            data: Master dataset as read from parquet
+        
+        Returns:
+            DataFrame with compact dtypes
+        """
+        data = data.drop(columns=[column for column in STORAGE_DROP_COLUMNS if column in data.columns])
+        for column, dtype in STORAGE_DTYPES.items():
+            if column in data.columns and data[column].dtype != dtype:
+                data[column] = data[column].astype(dtype)
+        
+        # Ensure date column is datetime
+        if 'date' in data.columns:
+            data['date'] = pd.to_datetime(data['date'])
+        if 'float_id' in data.columns and not isinstance(data['float_id'].dtype, pd.CategoricalDtype):
+            data['float_id'] = data['float_id'].astype(str).astype('category')
+        
+        return data
+    
+    def attach_shared_dataset(self, data_signature: Tuple) -> Optional[SharedDataset]:
+        """
+        Attach to the shared-memory copy of the dataset, if a server published this version.
+        
+        Args:
+            data_signature: Signature of the dataset file being loaded
+        
+        Returns:
+            SharedDataset, whose segments stay mapped for as long as the engine holds it, or None
+        """
+        return SharedDataset.attach(get_manifest_path(self.data_path), data_signature[0])
+    
+    def get_arrow_cache_path(self) -> str:
+        """Path of the Arrow IPC cache belonging to the parquet file"""
+        return os.path.splitext(self.data_path)[0] + ARROW_CACHE_SUFFIX
+    
+    def read_arrow_cache(self, data_signature: Tuple) -> Optional[pd.DataFrame]:
+        """
+        Memory-map the Arrow IPC cache if it was written from the current parquet file.
+        
+        Numeric and date columns of the returned DataFrame are read-only views
+        of the mapped file, so nothing is decoded or copied and every process
+        mapping the file shares one page-cache copy.
+        
+        Args:
+            data_signature: Signature of the parquet file being loaded
+        
+        Returns:
+            DataFrame over the mapped file, or None if the cache is missing or stale
+        """
+        cache_path = self.get_arrow_cache_path()
+        if not os.path.exists(cache_path):
+            return None
+        
+        try:
+            reader = pa.ipc.open_file(pa.memory_map(cache_path, 'r'))
+            metadata = reader.schema.metadata or {}
+            if metadata.get(ARROW_CACHE_SOURCE_KEY) != json.dumps(data_signature[0]).encode():
+                logger.info(f"Arrow cache {cache_path} is older than {self.data_path}, rebuilding it")
+                return None
+            
+            data = reader.read_all().to_pandas(split_blocks=True)
+            logger.info(f"Memory-mapped {len(data)} records from Arrow cache {cache_path}")
+            return data
+        except (OSError, pa.ArrowInvalid) as e:
+            logger.warning(f"Ignoring unreadable Arrow cache {cache_path}: {str(e)}")
+            return None
+    
+    def write_arrow_cache(self, data: pd.DataFrame, data_signature: Tuple) -> pd.DataFrame:
+        """
+        Write the loaded table as an uncompressed Arrow IPC file and map it back.
+        
+        The table is stored in date order, so loading from the cache skips the
+        sort too. Float columns keep NaN as values rather than nulls, which
+        lets them convert back to pandas without a copy.
+        
+        Args:
+            data: Table read from parquet, in the storage dtypes
+            data_signature: Signature of the parquet file it was read from
+        
+        Returns:
+            The memory-mapped table, or data itself if the cache cannot be written
+        """
+        cache_path = self.get_arrow_cache_path()
+        data = self.sort_by_date(data)
+        
+        arrays = {}
+        for column in data.columns:
+            values = data[column]
+            arrays[column] = pa.array(values.to_numpy()) if isinstance(values.dtype, np.dtype) else pa.Array.from_pandas(values)
+        table = pa.table(arrays, metadata={ARROW_CACHE_SOURCE_KEY: json.dumps(data_signature[0]).encode()})
+        
+        tmp_path = f"{cache_path}.tmp{os.getpid()}"
         try:
-            self.data = pd.read_parquet(self.data_path)
-            logger.info(f"Loaded dataset with {len(self.data)} records")
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, cache_path)
+            logger.info(f"Wrote Arrow cache {cache_path} ({os.path.getsize(cache_path) / (1024*1024):.1f} MB)")
+        except OSError as e:
+            logger.warning(f"Failed to write Arrow cache {cache_path}: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return data
+        
+        mapped = self.read_arrow_cache(data_signature)
+        return mapped if mapped is not None else data
+    
+    def sort_by_date(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Put the table in date order; consolidation already writes it that way"""
+        if 'date' in data.columns and not data['date'].is_monotonic_increasing:
+            logger.info("Dataset is not in date order, sorting on load")
+            data = data.sort_values('date', kind='mergesort', na_position='last')
+        return data
+    
+    def freeze_table(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Rebuild a DataFrame over read-only views of its column arrays.
+        
+        No column is copied; an in-place write to the result raises instead
+        of silently changing a table that other queries and sessions share.
+        
+        Args:
+            data: DataFrame to freeze
+        
+        Returns:
+            DataFrame sharing data's memory, with NumPy-backed columns read-only
+        """
+        columns = {}
+        for column in data.columns:
+            values = data[column].to_numpy() if isinstance(data[column].dtype, np.dtype) else data[column].array
+            if isinstance(values, np.ndarray):
+                values = values.view()
+                values.flags.writeable = False
+            columns[column] = values
+        
+        frozen = pd.DataFrame(columns, index=data.index, copy=False)
+        frozen.attrs.update(data.attrs)
+        return frozen
+    
+    def build_indexes(self, data: pd.DataFrame, spatial_index: SpatialGridIndex = None) -> Dict[str, Any]:
+        """
+        Build the in-memory indexes over a loaded table.
+        
+        Args:
+            data: Table in the storage dtypes
+            spatial_index: Index already built over data in date order (the shared
+                dataset's), used instead of building one
+        
+        Returns:
+            The resident table (date order, read-only) with its sorted_dates and
+            spatial_index, for install_state
+        """
+        # Consolidation writes date order; other sort orders are restored here once
+        sorted_data = self.sort_by_date(data)
+        if sorted_data is not data:
+            spatial_index = None
+        data = sorted_data
+        
+        # Queries filter the shared table through positions and read-only views and
+        # materialize only their result, so it is never copied after loading
+        data.index = pd.RangeIndex(len(data))
+        data = self.freeze_table(data)
+        indexes = {'data': data, 'sorted_dates': None, 'spatial_index': None}
+        if 'date' in data.columns:
+            indexes['sorted_dates'] = data['date'].to_numpy()
+        
+        # Positional indexes are built after sorting so they refer to final row positions
+        if spatial_index is not None:
+            indexes['spatial_index'] = spatial_index
+        elif {'latitude', 'longitude'} <= set(data.columns):
+            indexes['spatial_index'] = SpatialGridIndex(
+                data['latitude'].to_numpy(), data['longitude'].to_numpy(), SPATIAL_INDEX_CELL_DEGREES
+            )
+        return indexes
+    
+    def open_dataset(self) -> Tuple[ds.Dataset, float]:
+        """
+        Open the parquet file or hive-partitioned dataset without reading any rows.
+        
+        Returns:
+            (dataset, partition cell size in degrees)
+        """
+        try:
+            partitioning = 'hive' if os.path.isdir(self.data_path) else None
+            dataset = ds.dataset(self.data_path, format='parquet', partitioning=partitioning)
             
-            # Ensure date column is datetime
-            if 'date' in self.data.columns:
-                self.data['date'] = pd.to_datetime(self.data['date'])
+            cell_degrees = DEFAULT_PARTITION_CELL_DEGREES
+            common_metadata = os.path.join(self.data_path, '_common_metadata')
+            if os.path.exists(common_metadata):
+                metadata = pq.read_schema(common_metadata).metadata or {}
+                if PARTITION_METADATA_KEY in metadata:
+                    cell_degrees = float(metadata[PARTITION_METADATA_KEY])
             
+            logger.info(f"Opened dataset for pushdown queries with {len(dataset.files)} files "
+                        f"({cell_degrees:g}° partition cells)")
+            return dataset, cell_degrees
+        
         except Exception as e:
-            logger.error(f"Failed to load data from {self.data_path}: {str(e)}")
+            logger.error(f"Failed to open dataset {self.data_path}: {str(e)}")
             raise
     
-    def get_location_bounds(self, location: str) -> Optional[Dict[str, float]]:
+    def get_date_window(self, date: str = None, date_range=None) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
         """
-        Get bounding box coordinates for a location.
+        Resolve a date or date range into an inclusive (start, end) window.
+        
+        Args:
+            date: Specific date (YYYY-MM-DD), widened by ±30 days
+            date_range: (start, end) tuple or dict with 'start' and 'end' keys
+        
+        Returns:
+            Tuple of start and end timestamps, or None if nothing usable was given
+        """
+        if date:
+            target_date = pd.to_datetime(date)
+            return target_date - timedelta(days=DATE_WINDOW_DAYS), target_date + timedelta(days=DATE_WINDOW_DAYS)
+        
+        if date_range:
+            if isinstance(date_range, dict):
+                start, end = date_range.get('start'), date_range.get('end')
+            else:
+                start, end = date_range
+            return pd.to_datetime(start), pd.to_datetime(end)
+        
+        return None
+    
+    def date_slice(self, start_date: pd.Timestamp, end_date: pd.Timestamp) -> Tuple[int, int]:
+        """Row range [start, stop) of the resident table inside an inclusive date window"""
+        start = np.searchsorted(self.sorted_dates, np.datetime64(start_date, 'ns'), side='left')
+        stop = np.searchsorted(self.sorted_dates, np.datetime64(end_date, 'ns'), side='right')
+        return int(start), int(max(start, stop))
+    
+    def get_depth_bounds(self, depth_range) -> Tuple[float, float]:
+        """
+        Resolve a depth range into inclusive (min, max) pressure bounds.
+        
+        Args:
+            depth_range: (min, max) tuple or dict with 'min' and 'max' keys
+        
+        Returns:
+            Tuple of minimum and maximum depth
+        """
+        if isinstance(depth_range, dict):
+            return depth_range.get('min', 0), depth_range.get('max', float('inf'))
+        
+        min_depth, max_depth = depth_range
+        return min_depth, max_depth
+    
+    def build_partition_filter(self, entities):
+        """
+        Translate query entities into a filter on the hive partition keys.
+        
+        The filter only references year, month, lat_cell and lon_cell, so the
+        dataset can discard whole partition directories before reading; the
+        exact row filters are still applied afterwards.
+        
+        Args:
+            entities: QueryEntity object with extracted parameters
+        
+        Returns:
+            pyarrow.dataset.Expression or None when nothing can be pruned
+        """
+        expression = None
+        
+        def combine(condition):
+            return condition if expression is None else expression & condition
+        
+        try:
+            window = self.get_date_window(entities.date, entities.date_range)
+        except Exception as e:
+            logger.error(f"Failed to parse date for partition pruning: {str(e)}")
+            window = None
+        
+        if window is not None:
+            start, end = window
+            year, month = ds.field('year'), ds.field('month')
+            expression = combine(
+                ((year > start.year) | ((year == start.year) & (month >= start.month))) &
+                ((year < end.year) | ((year == end.year) & (month <= end.month)))
+            )
+        
+        bounds = self.get_location_bounds(entities.location) if entities.location else None
+        if bounds is not None:
+            cell = self.partition_cell_degrees
+            lat_cell, lon_cell = ds.field('lat_cell'), ds.field('lon_cell')
+            lon_condition = None
+            for low, high in longitude_ranges(bounds['lon_min'], bounds['lon_max']):
+                in_range = (lon_cell >= math.floor(low / cell) * cell) & (lon_cell <= high)
+                lon_condition = in_range if lon_condition is None else lon_condition | in_range
+            expression = combine(
+                (lat_cell >= math.floor(bounds['lat_min'] / cell) * cell) & (lat_cell <= bounds['lat_max']) &
+                lon_condition
+            )
+        
+        return expression
+    
+    def build_row_filter(self, entities):
+        """
+        Translate query entities into an exact row filter for the parquet reader.
+        
+        The predicates mirror filter_by_parameter, filter_by_location,
+        filter_by_date and filter_by_depth, so the reader can skip row groups
+        from their min/max statistics and return only matching rows.
+        
+        Args:
+            entities: QueryEntity object with extracted parameters
+        
+        Returns:
+            pyarrow.dataset.Expression or None when no filter applies
+        """
+        names = self.dataset.schema.names
+        conditions = []
+        
+        if entities.parameter:
+            if entities.parameter in names:
+                conditions.append(~ds.field(entities.parameter).is_null(nan_is_null=True))
+            else:
+                logger.warning(f"Parameter '{entities.parameter}' not found in dataset")
+        
+        if entities.location:
+            bounds = self.get_location_bounds(entities.location)
+            if bounds is None:
+                logger.warning(f"Could not find bounds for location: {entities.location}")
+            else:
+                lon_condition = None
+                for low, high in longitude_ranges(bounds['lon_min'], bounds['lon_max']):
+                    in_range = (ds.field('longitude') >= low) & (ds.field('longitude') <= high)
+                    lon_condition = in_range if lon_condition is None else lon_condition | in_range
+                conditions.extend([
+                    ds.field('latitude') >= bounds['lat_min'],
+                    ds.field('latitude') <= bounds['lat_max'],
+                    lon_condition,
+                ])
+        
+        if (entities.date or entities.date_range) and 'date' in names:
+            try:
+                start_date, end_date = self.get_date_window(entities.date, entities.date_range)
+                date_type = self.dataset.schema.field('date').type
+                conditions.extend([
+                    ds.field('date') >= pa.scalar(start_date.to_datetime64()).cast(date_type),
+                    ds.field('date') <= pa.scalar(end_date.to_datetime64()).cast(date_type),
+                ])
+            except Exception as e:
+                logger.error(f"Failed to parse date filter: {str(e)}")
+        
+        if entities.depth_range and 'pressure' in names:
+            try:
+                min_depth, max_depth = self.get_depth_bounds(entities.depth_range)
+                conditions.extend([ds.field('pressure') >= min_depth, ds.field('pressure') <= max_depth])
+            except Exception as e:
+                logger.error(f"Failed to apply depth filter: {str(e)}")
+        
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return expression
+    
+    def read_matching_rows(self, entities, columns: List[str] = None) -> pd.DataFrame:
+        """
+        Read only the rows and columns a query needs from the dataset.
+        
+        Partition keys prune whole directories, row group statistics skip
+        non-matching row groups, and the row filter is evaluated by the
+        reader, so nothing beyond the result is materialized in pandas.
+        
+        Args:
+            entities: QueryEntity object with extracted parameters
+            columns: Columns to read (default: all data columns)
+        
+        Returns:
+            DataFrame with the matching rows
+        """
+        partition_filter = None
+        if set(PARTITION_COLUMNS) <= set(self.dataset.schema.names):
+            partition_filter = self.build_partition_filter(entities)
+            if partition_filter is not None:
+                matching_files = sum(1 for _ in self.dataset.get_fragments(filter=partition_filter))
+                logger.info(f"Partition pruning kept {matching_files} of {len(self.dataset.files)} files")
+        
+        row_filter = self.build_row_filter(entities)
+        if partition_filter is not None and row_filter is not None:
+            row_filter = partition_filter & row_filter
+        elif row_filter is None:
+            row_filter = partition_filter
+        
+        if columns is None:
+            columns = [name for name in self.dataset.schema.names if name not in PARTITION_COLUMNS]
+        
+        # The reader filters on the bounding box; polygon regions are refined here on the positions
+        bounds = self.get_location_bounds(entities.location) if entities.location else None
+        region = bounds.get('region') if bounds is not None else None
+        read_columns = list(columns)
+        if region is not None:
+            read_columns += [name for name in ('latitude', 'longitude') if name not in columns]
+        
+        table = self.dataset.to_table(columns=read_columns, filter=row_filter)
+        logger.info(f"Pushdown read returned {table.num_rows} records with columns {read_columns}")
+        result_df = table.to_pandas()
+        
+        if region is not None and not result_df.empty:
+            inside = region.contains(result_df['latitude'].to_numpy(), result_df['longitude'].to_numpy())
+            result_df = result_df[inside]
+        return result_df[columns]
+    
+    def resolve_location(self, location: str) -> Tuple[bool, Optional[Dict[str, float]]]:
+        """
+        Look up the bounding box of a location.
         
         Args:
             location: Location name
             
         Returns:
-            Dictionary with lat_min, lat_max, lon_min, lon_max or None
+            (resolved, bounds): resolved is False while a geocoder lookup is
+            still running or has failed; bounds holds lat_min, lat_max,
+            lon_min, lon_max, or is None for an unknown location
         """
-        location_lower = location.lower()
+        location_lower = normalize_location(location)
         
-        # Check predefined locations first
+        # Check predefined and gazetteer locations first
         if location_lower in self.location_bounds:
-            return self.location_bounds[location_lower]
+            return True, self.location_bounds[location_lower]
         
-        # Try geocoding for dynamic location lookup
-        try:
-            logger.info(f"Geocoding location: {location}")
-            location_data = self.geocoder.geocode(location, exactly_one=True, timeout=10)
+        # Then earlier geocoder answers, including names it did not know
+        found, bounds = self.geocode_cache.get(location)
+        if found:
+            logger.info(f"Geocode cache hit for {location}: {bounds}")
+            return True, bounds
             
-            if location_data:
-                lat, lon = location_data.latitude, location_data.longitude
-                
-                # Create a bounding box around the point (±2 degrees)
-                bounds = {
-                    'lat_min': lat - 2,
-                    'lat_max': lat + 2,
-                    'lon_min': lon - 2,
-                    'lon_max': lon + 2
-                }
-                
-                logger.info(f"Geocoded {location} to bounds: {bounds}")
-                return bounds
+        # Ask the geocoder, waiting no longer than the latency budget
+        return self.background_geocoder.resolve(location)
+    
+    def get_location_bounds(self, location: str) -> Optional[Dict[str, float]]:
+        """
+        Get bounding box coordinates for a location.
+        
+        Args:
+            location: Location name
             
-        except (GeocoderTimedOut, GeocoderUnavailable) as e:
-            logger.warning(f"Geocoding failed for {location}: {str(e)}")
+        Returns:
+            Dictionary with lat_min, lat_max, lon_min, lon_max or None
+        """
+        return self.resolve_location(location)[1]
+                
+    def result_columns(self, columns: Optional[List[str]]) -> Optional[List[str]]:
+        """
+        Validate the columns requested for a query result.
         
-        return None
+        Args:
+            columns: Requested column names, or None for every column
+        
+        Returns:
+            The requested columns present in the dataset (in request order), or
+            None when every column is wanted
+        """
+        if columns is None:
+            return None
+        
+        if self.data is not None:
+            available = set(self.data.columns)
+        else:
+            available = set(self.dataset.schema.names) - set(PARTITION_COLUMNS)
+        
+        missing = [name for name in columns if name not in available]
+        if missing:
+            logger.warning(f"Requested columns not found in dataset: {missing}")
+        return [name for name in dict.fromkeys(columns) if name in available]
+    
+    def unresolved_location_result(self, location: str, columns: List[str] = None) -> pd.DataFrame:
+        """Empty result marking a location whose lookup has not finished yet"""
+        columns = self.result_columns(columns)
+        if columns is None:
+            columns = list(self.data.columns) if self.data is not None else list(self.dataset.schema.names)
+        result_df = pd.DataFrame(columns=columns)
+        result_df.attrs['unresolved_location'] = location
+        result_df.attrs['next_cursor'] = None
+        return result_df
     
     def filter_by_location(self, df: pd.DataFrame, location: str) -> pd.DataFrame:
         """
@@ -112,14 +858,29 @@ class QueryEngine:
             logger.warning(f"Could not find bounds for location: {location}")
             return df  # Return unfiltered data if location not found
         
-        # Apply geographic filter
+        # The resident table is answered from the grid index in time proportional to the hits
+        if df is self.data and self.spatial_index is not None:
+            if 'region' in bounds:
+                rows = self.spatial_index.query_region(bounds['region'])
+            else:
+                rows = self.spatial_index.query(bounds['lat_min'], bounds['lat_max'], bounds['lon_min'], bounds['lon_max'])
+            filtered_df = df.take(rows)
+            logger.info(f"Location filter '{location}' reduced data from {len(df)} to {len(filtered_df)} records (grid index)")
+            return filtered_df
+        
+        # Apply geographic filter (longitude ranges wrap across the antimeridian)
         mask = (
             (df['latitude'] >= bounds['lat_min']) &
             (df['latitude'] <= bounds['lat_max']) &
-            (df['longitude'] >= bounds['lon_min']) &
-            (df['longitude'] <= bounds['lon_max'])
+            longitude_mask(df['longitude'], bounds['lon_min'], bounds['lon_max'])
         )
         
+        # Polygon regions: the box is a prefilter, the exact test runs on its hits only
+        if 'region' in bounds:
+            in_box = mask.to_numpy().copy()
+            in_box[in_box] = bounds['region'].contains(df['latitude'].to_numpy()[in_box], df['longitude'].to_numpy()[in_box])
+            mask = in_box
+        
         filtered_df = df[mask]
         logger.info(f"Location filter '{location}' reduced data from {len(df)} to {len(filtered_df)} records")
         
@@ -166,13 +927,9 @@ class QueryEngine:
         
         if date:
             try:
-                target_date = pd.to_datetime(date)
                 # Filter for data within ±30 days of target date
-                start_date = target_date - timedelta(days=30)
-                end_date = target_date + timedelta(days=30)
-                
-                mask = (df['date'] >= start_date) & (df['date'] <= end_date)
-                filtered_df = df[mask]
+                start_date, end_date = self.get_date_window(date=date)
+                filtered_df = self._slice_dates(df, start_date, end_date)
                 
                 logger.info(f"Date filter '{date}' (±30 days) reduced data from {original_len} to {len(filtered_df)} records")
                 return filtered_df
@@ -182,11 +939,8 @@ class QueryEngine:
         
         elif date_range:
             try:
-                start_date = pd.to_datetime(date_range.get('start'))
-                end_date = pd.to_datetime(date_range.get('end'))
-                
-                mask = (df['date'] >= start_date) & (df['date'] <= end_date)
-                filtered_df = df[mask]
+                start_date, end_date = self.get_date_window(date_range=date_range)
+                filtered_df = self._slice_dates(df, start_date, end_date)
                 
                 logger.info(f"Date range filter reduced data from {original_len} to {len(filtered_df)} records")
                 return filtered_df
@@ -196,13 +950,21 @@ class QueryEngine:
         
         return df
     
+    def _slice_dates(self, df: pd.DataFrame, start_date: pd.Timestamp, end_date: pd.Timestamp) -> pd.DataFrame:
+        """Rows of df inside the window: a binary-searched view of the sorted resident table, else a mask"""
+        if df is self.data and self.sorted_dates is not None:
+            return df.iloc[slice(*self.date_slice(start_date, end_date))]
+        
+        mask = (df['date'] >= start_date) & (df['date'] <= end_date)
+        return df[mask]
+    
     def filter_by_depth(self, df: pd.DataFrame, depth_range: Dict) -> pd.DataFrame:
         """
         Filter data by depth/pressure range.
         
         Args:
             df: DataFrame to filter
-            depth_range: Dict with 'min' and 'max' depth values
+            depth_range: (min, max) tuple or dict with 'min' and 'max' depth values
             
         Returns:
             Filtered DataFrame
@@ -212,8 +974,7 @@ class QueryEngine:
             return df
         
         try:
-            min_depth = depth_range.get('min', 0)
-            max_depth = depth_range.get('max', float('inf'))
+            min_depth, max_depth = self.get_depth_bounds(depth_range)
             
             # Approximate conversion: 1 meter depth ≈ 1 dbar pressure
             mask = (df['pressure'] >= min_depth) & (df['pressure'] <= max_depth)
@@ -226,69 +987,563 @@ class QueryEngine:
             logger.error(f"Failed to apply depth filter: {str(e)}")
             return df
     
-    def execute_query(self, entities) -> pd.DataFrame:
+    def plan_selection(self, entities):
         """
-        Execute a query based on extracted entities.
+        Prepare the fused filter of a query over the resident table.
+        
+        The date window and the location box are answered from the sorted-date
+        and grid indexes; the remaining predicates are fused into a single
+        mask function applied to chunks of candidate rows.
         
         Args:
             entities: QueryEntity object with extracted parameters
-            
+        
         Returns:
-            Filtered DataFrame
+            (start, stop, candidates, evaluate): candidates is an ascending
+            array of row positions, or None for every row in [start, stop);
+            evaluate(chunk) returns the match mask of a chunk of positions
         """
-        logger.info(f"Executing query with entities: {entities}")
+        data = self.data
+        start, stop = 0, len(data)
+        candidates = None  # None means every row in [start, stop)
+        predicates = []
+        region = None  # polygon tested last, only on rows that passed everything else
         
-        if self.data is None:
-            logger.error("No data loaded")
-            return pd.DataFrame()
+        if (entities.date or entities.date_range) and 'date' in data.columns:
+            try:
+                start_date, end_date = self.get_date_window(date=entities.date, date_range=entities.date_range)
+                if self.sorted_dates is not None:
+                    start, stop = self.date_slice(start_date, end_date)
+                else:
+                    dates = data['date'].to_numpy()
+                    low, high = np.datetime64(start_date, 'ns'), np.datetime64(end_date, 'ns')
+                    predicates.append((dates, lambda values: (values >= low) & (values <= high)))
+            except Exception as e:
+                logger.error(f"Failed to parse date filter: {str(e)}")
         
-        # Start with full dataset
-        result_df = self.data.copy()
+        if entities.location:
+            bounds = self.get_location_bounds(entities.location)
+            if bounds is None:
+                logger.warning(f"Could not find bounds for location: {entities.location}")
+            elif self.spatial_index is not None:
+                if 'region' in bounds:
+                    rows = self.spatial_index.query_region(bounds['region'])
+                else:
+                    rows = self.spatial_index.query(bounds['lat_min'], bounds['lat_max'], bounds['lon_min'], bounds['lon_max'])
+                candidates = rows[np.searchsorted(rows, start):np.searchsorted(rows, stop)]
+            else:
+                latitude, longitude = data['latitude'].to_numpy(), data['longitude'].to_numpy()
+                predicates.append((latitude, lambda values: (values >= bounds['lat_min']) & (values <= bounds['lat_max'])))
+                predicates.append((longitude, lambda values: longitude_mask(values, bounds['lon_min'], bounds['lon_max'])))
+                region = bounds.get('region')
         
-        # Apply filters based on entities
         if entities.parameter:
-            result_df = self.filter_by_parameter(result_df, entities.parameter)
+            if entities.parameter in data.columns:
+                predicates.append((data[entities.parameter].to_numpy(), lambda values: ~pd.isna(values)))
+            else:
+                logger.warning(f"Parameter '{entities.parameter}' not found in dataset")
+        
+        if entities.depth_range and 'pressure' in data.columns:
+            try:
+                min_depth, max_depth = self.get_depth_bounds(entities.depth_range)
+                predicates.append((data['pressure'].to_numpy(), lambda values: (values >= min_depth) & (values <= max_depth)))
+            except Exception as e:
+                logger.error(f"Failed to apply depth filter: {str(e)}")
+        
+        def evaluate(chunk: np.ndarray) -> np.ndarray:
+            contiguous = len(chunk) > 0 and chunk[-1] - chunk[0] == len(chunk) - 1
+            rows = slice(chunk[0], chunk[-1] + 1) if contiguous else chunk
+            
+            mask = np.ones(len(chunk), dtype=bool)
+            for column, predicate in predicates:
+                mask &= predicate(column[rows])
+            if region is not None:
+                survivors = np.flatnonzero(mask)
+                mask[survivors] = region.contains(latitude[rows][survivors], longitude[rows][survivors])
+            return mask
+        
+        return start, stop, candidates, (evaluate if predicates else None)
+    
+    @staticmethod
+    def _candidate_chunk(start: int, candidates: Optional[np.ndarray], low: int, high: int) -> np.ndarray:
+        """Positions [low, high) of the candidate list (a plain range when candidates is None)"""
+        if candidates is None:
+            return np.arange(start + low, start + high)
+        return candidates[low:high]
+    
+    def select_rows(self, entities) -> np.ndarray:
+        """
+        Evaluate all filters of a query over the resident table in one pass.
+        
+        Args:
+            entities: QueryEntity object with extracted parameters
+        
+        Returns:
+            Ascending row positions of the matching rows
+        """
+        start, stop, candidates, evaluate = self.plan_selection(entities)
+        total = stop - start if candidates is None else len(candidates)
+        if evaluate is None:
+            return self._candidate_chunk(start, candidates, 0, total)
+        
+        selected = []
+        for offset in range(0, total, FUSED_CHUNK_ROWS):
+            chunk = self._candidate_chunk(start, candidates, offset, min(offset + FUSED_CHUNK_ROWS, total))
+            selected.append(chunk[evaluate(chunk)])
         
+        return np.concatenate(selected) if selected else np.empty(0, dtype=np.int64)
+    
+    def select_page(self, entities, cursor: Optional[int] = None,
+                    page_size: int = RESULT_PAGE_SIZE) -> Tuple[np.ndarray, Optional[int]]:
+        """
+        Find one page of matching rows, newest first.
+        
+        The resident table is sorted by date, so the newest matches are the
+        ones with the highest positions: candidates are scanned backwards in
+        growing chunks and the scan stops as soon as the page is full, instead
+        of filtering the whole table first.
+        
+        Args:
+            entities: QueryEntity object with extracted parameters
+            cursor: Position returned with the previous page (None for the first page)
+            page_size: Rows per page
+        
+        Returns:
+            (rows, next_cursor): descending row positions of the page, and the
+            cursor of the following page or None when this is the last one
+        """
+        start, stop, candidates, evaluate = self.plan_selection(entities)
+        if cursor is not None:
+            # Only rows older than the previous page (lower positions) remain
+            if candidates is None:
+                stop = max(start, min(stop, cursor))
+            else:
+                candidates = candidates[:np.searchsorted(candidates, cursor)]
+        
+        wanted = page_size + 1  # one extra row tells whether another page exists
+        found, found_rows = [], 0
+        high = stop - start if candidates is None else len(candidates)
+        chunk_rows = max(4 * wanted, 4096)
+        while high > 0 and found_rows < wanted:
+            low = max(0, high - chunk_rows)
+            chunk = self._candidate_chunk(start, candidates, low, high)
+            matches = chunk if evaluate is None else chunk[evaluate(chunk)]
+            found.append(matches[::-1])
+            found_rows += len(matches)
+            high = low
+            chunk_rows = min(2 * chunk_rows, FUSED_CHUNK_ROWS)
+        
+        rows = np.concatenate(found)[:wanted] if found else np.empty(0, dtype=np.int64)
+        if len(rows) > page_size:
+            return rows[:page_size], int(rows[page_size - 1])
+        return rows, None
+    
+    def execute_fused(self, entities, cursor: Optional[int] = None, page_size: int = RESULT_PAGE_SIZE,
+                      columns: List[str] = None) -> pd.DataFrame:
+        """
+        Run a query through the fused kernel and materialize one page of it.
+        
+        Args:
+            entities: QueryEntity object with extracted parameters
+            cursor: Cursor of the page to fetch (None for the newest rows)
+            page_size: Rows per page
+            columns: Columns to materialize (default: all)
+        
+        Returns:
+            Filtered DataFrame page, newest first
+        """
+        rows, next_cursor = self.select_page(entities, cursor, page_size)
+        logger.info(f"Fused filter selected a page of {len(rows)} records")
+        
+        # Only the requested columns are gathered; the filters read the table in place
+        if columns is None:
+            result_df = self.data.take(rows)
+        else:
+            result_df = pd.DataFrame({name: self.data[name].take(rows) for name in columns})
+        result_df.attrs['next_cursor'] = next_cursor
+        return result_df
+    
+    def execute_query(self, entities, columns: List[str] = None) -> pd.DataFrame:
+        """
+        Execute a query based on extracted entities.
+        
+        Args:
+            entities: QueryEntity object with extracted parameters
+            columns: Columns the caller needs (default: all)
+        
+        Returns:
+            Filtered DataFrame holding the newest RESULT_PAGE_SIZE matches;
+            attrs['next_cursor'] fetches the next page through execute_page
+        """
+        return self.execute_page(entities, columns=columns)
+    
+    def execute_page(self, entities, cursor: Optional[int] = None, page_size: int = RESULT_PAGE_SIZE,
+                     columns: List[str] = None) -> pd.DataFrame:
+        """
+        Execute a query and return one page of its results, newest first.
+        
+        Args:
+            entities: QueryEntity object with extracted parameters
+            cursor: attrs['next_cursor'] of the previous page (None for the first page)
+            page_size: Rows per page
+            columns: Columns the caller needs (default: all); filters may use
+                other columns, but only these are copied into the result
+        
+        Returns:
+            Filtered DataFrame page; attrs['next_cursor'] is None on the last page
+        """
+        logger.info(f"Executing query with entities: {entities} (cursor {cursor})")
+        
+        if self.result_cache is not None:
+            self.refresh_if_changed()
+        
+        # Resolve the location up front; a lookup still running in the background,
+        # or failed and awaiting its retry, is answered at once as unresolved (and
+        # not cached), rather than as an unfiltered global result
+        resolved = True
         if entities.location:
-            result_df = self.filter_by_location(result_df, entities.location)
+            resolved, _ = self.resolve_location(entities.location)
         
-        if entities.date:
-            result_df = self.filter_by_date(result_df, date=entities.date)
-        elif entities.date_range:
-            result_df = self.filter_by_date(result_df, date_range=entities.date_range)
+        # The table, its indexes and the cached results stay consistent until the query ends
+        with self.table_lock.shared():
+            if self.data is None and self.dataset is None:
+                logger.error("No data loaded")
+                return pd.DataFrame()
+            
+            if not resolved:
+                logger.info(f"Location '{entities.location}' is not resolved yet")
+                return self.unresolved_location_result(entities.location, columns)
+            
+            columns = self.result_columns(columns)
+            if self.result_cache is None:
+                return self._run_query(entities, cursor, page_size, columns)
+            
+            key = (self.cache_key(entities), cursor, page_size, tuple(columns) if columns is not None else None)
+            result_df = self.result_cache.get(key)
+            if result_df is not None:
+                logger.info(f"Query served from result cache ({len(result_df)} records)")
+            else:
+                result_df = self.freeze_table(self._run_query(entities, cursor, page_size, columns))
+                self.result_cache.put(key, result_df)
+        
+        # Callers get their own frame over the cached, read-only column arrays
+        return result_df.copy(deep=False)
         
-        if entities.depth_range:
-            result_df = self.filter_by_depth(result_df, entities.depth_range)
+    def _run_query(self, entities, cursor: Optional[int] = None, page_size: int = RESULT_PAGE_SIZE,
+                   columns: List[str] = None) -> pd.DataFrame:
+        """Filter the dataset for one page of a query, without the result cache"""
+        if self.dataset is not None:
+            # Lazy path: all filters are pushed down to the parquet reader; pages
+            # are offsets into the matches sorted newest first. The reader also
+            # fetches the columns needed for ordering and the polygon refinement
+            read_columns = None
+            if columns is not None:
+                read_columns = columns + [name for name in ('date', 'latitude', 'longitude')
+                                          if name not in columns and name in self.dataset.schema.names]
+            result_df = self.read_matching_rows(entities, read_columns)
+            if 'date' in result_df.columns:
+                result_df = result_df.sort_values('date', ascending=False, kind='stable')
+            offset = cursor or 0
+            next_cursor = offset + page_size if len(result_df) > offset + page_size else None
+            result_df = result_df.iloc[offset:offset + page_size]
+            if columns is not None:
+                result_df = result_df[columns]
+        elif self.fused:
+            result_df = self.execute_fused(entities, cursor, page_size, columns)
+            next_cursor = result_df.attrs['next_cursor']
+        else:
+            # Start with full dataset
+            result_df = self.data
         
-        # Limit results for performance (show latest data first)
-        if len(result_df) > 10000:
-            logger.info(f"Limiting results from {len(result_df)} to 10000 records")
-            result_df = result_df.nlargest(10000, 'date')
+            # Apply filters based on entities. Date and location go first: on the full
+            # table they are answered from the sorted-date and grid indexes
+            if entities.date:
+                result_df = self.filter_by_date(result_df, date=entities.date)
+            elif entities.date_range:
+                result_df = self.filter_by_date(result_df, date_range=entities.date_range)
+        
+            if entities.location:
+                result_df = self.filter_by_location(result_df, entities.location)
+            
+            if entities.parameter:
+                result_df = self.filter_by_parameter(result_df, entities.parameter)
+            
+            if entities.depth_range:
+                result_df = self.filter_by_depth(result_df, entities.depth_range)
+            
+            # The resident table is date-sorted with positional labels, so newest
+            # first is descending label order and the cursor is the last label shown
+            if cursor is not None:
+                result_df = result_df[result_df.index < cursor]
+            result_df = result_df.iloc[::-1].head(page_size + 1)
+            next_cursor = int(result_df.index[page_size - 1]) if len(result_df) > page_size else None
+            result_df = result_df.head(page_size)
+            result_df = result_df[columns] if columns is not None else result_df.copy()
         
-        logger.info(f"Query executed successfully, returning {len(result_df)} records")
+        result_df.attrs['next_cursor'] = next_cursor
+        logger.info(f"Query executed successfully, returning {len(result_df)} records"
+                    + (" (more available)" if next_cursor is not None else ""))
         return result_df
     
     def get_dataset_summary(self) -> Dict:
         """Get summary statistics of the loaded dataset"""
-        if self.data is None:
-            return {}
+        with self.table_lock.shared():
+            if self.data is None and self.dataset is not None:
+                if self._dataset_summary is None:
+                    self._dataset_summary = self._summarize_dataset()
+                return self._dataset_summary
+            
+            if self.data is None:
+                return {}
+            
+            return {
+                'total_records': len(self.data),
+                'float_count': self.data['float_id'].nunique() if 'float_id' in self.data.columns else 0,
+                'date_range': {
+                    'start': self.data['date'].min().isoformat() if 'date' in self.data.columns else None,
+                    'end': self.data['date'].max().isoformat() if 'date' in self.data.columns else None
+                },
+                'parameter_counts': {
+                    param: self.data[param].notna().sum() 
+                    for param in ['temperature', 'salinity', 'pressure']
+                    if param in self.data.columns
+                },
+                'geographic_bounds': {
+                    'lat_min': self.data['latitude'].min() if 'latitude' in self.data.columns else None,
+                    'lat_max': self.data['latitude'].max() if 'latitude' in self.data.columns else None,
+                    'lon_min': self.data['longitude'].min() if 'longitude' in self.data.columns else None,
+                    'lon_max': self.data['longitude'].max() if 'longitude' in self.data.columns else None,
+                }
+            }
+    
+    def _summarize_dataset(self) -> Dict:
+        """Compute the dataset summary column by column from the lazily opened dataset"""
+        names = self.dataset.schema.names
+        
+        def column_range(column):
+            if column not in names:
+                return None, None
+            values = self.dataset.to_table(columns=[column])[column]
+            return pc.min(values).as_py(), pc.max(values).as_py()
+        
+        date_min, date_max = column_range('date')
+        lat_min, lat_max = column_range('latitude')
+        lon_min, lon_max = column_range('longitude')
         
         return {
-            'total_records': len(self.data),
-            'float_count': self.data['float_id'].nunique() if 'float_id' in self.data.columns else 0,
+            'total_records': self.dataset.count_rows(),
+            'float_count': len(pc.unique(self.dataset.to_table(columns=['float_id'])['float_id'])) if 'float_id' in names else 0,
             'date_range': {
-                'start': self.data['date'].min().isoformat() if 'date' in self.data.columns else None,
-                'end': self.data['date'].max().isoformat() if 'date' in self.data.columns else None
+                'start': pd.Timestamp(date_min).isoformat() if date_min is not None else None,
+                'end': pd.Timestamp(date_max).isoformat() if date_max is not None else None
             },
             'parameter_counts': {
-                param: self.data[param].notna().sum() 
+                param: self.dataset.count_rows(filter=~ds.field(param).is_null(nan_is_null=True))
                 for param in ['temperature', 'salinity', 'pressure']
-                if param in self.data.columns
+                if param in names
             },
             'geographic_bounds': {
-                'lat_min': self.data['latitude'].min() if 'latitude' in self.data.columns else None,
-                'lat_max': self.data['latitude'].max() if 'latitude' in self.data.columns else None,
-                'lon_min': self.data['longitude'].min() if 'longitude' in self.data.columns else None,
-                'lon_max': self.data['longitude'].max() if 'longitude' in self.data.columns else None,
+                'lat_min': lat_min,
+                'lat_max': lat_max,
+                'lon_min': lon_min,
+                'lon_max': lon_max,
             }
         }
+    
+    def get_source_signature(self, data_signature: Tuple) -> Optional[List[int]]:
+        """
+        Signature of the consolidated file the dataset comes from, as derived outputs record it.
+        
+        Args:
+            data_signature: Signature of the loaded dataset (get_data_signature)
+        
+        Returns:
+            [inode, size, mtime_ns] of the parquet file (for a partitioned
+            dataset, of the file it was written from), or None if unknown
+        """
+        if not os.path.isdir(self.data_path):
+            return list(data_signature[0]) if data_signature[0] is not None else None
+        return read_partition_source_signature(self.data_path)
+    
+    def open_aggregate_cube(self, source_signature: Optional[List[int]]) -> Optional[AggregateCube]:
+        """Open the aggregate cube, unless it was built from another version of the dataset"""
+        cube = AggregateCube.open(self.aggregate_cube_path)
+        if cube is not None and (source_signature is None or cube.source_signature != source_signature):
+            logger.warning(f"Ignoring aggregate cube {self.aggregate_cube_path}: it was built "
+                           f"from another version of the dataset")
+            return None
+        return cube
+    
+    def get_aggregate_stats(self, entities) -> Optional[Dict[str, float]]:
+        """
+        Answer parameter statistics of a query from the aggregate cube.
+        
+        Whole months and whole grid cells inside the query come from the
+        cube; the partial months at either end and the cells the area's
+        outline cuts through are read from the raw rows, so only they cost a
+        scan. Requests that do not fit the cube (depths off its bands,
+        windows shorter than a month) return None and are left to the raw rows.
+        
+        Args:
+            entities: QueryEntity object with extracted parameters
+        
+        Returns:
+            Dictionary with count, mean, std, min and max over every matching
+            row (not just the first result page), plus the approximate median
+            and percentiles when the cube holds digests; or None
+        """
+        if self.aggregate_cube is None or not entities.parameter:
+            return None
+        
+        bounds, covered = None, None
+        if entities.location:
+            bounds = self.get_location_bounds(entities.location)
+            if bounds is None:
+                return None
+        
+        try:
+            depth_bounds = self.get_depth_bounds(entities.depth_range) if entities.depth_range else None
+            window = self.get_date_window(date=entities.date, date_range=entities.date_range)
+        except Exception as e:
+            logger.error(f"Failed to parse query for the aggregate cube: {str(e)}")
+            return None
+        
+        months, fringes = None, []
+        if window is not None:
+            start, end = window
+            first = start.to_period('M').to_timestamp()
+            if first < start:
+                first += pd.offsets.MonthBegin(1)
+            stop = (end + pd.Timedelta(1, 'ns')).to_period('M').to_timestamp()
+            if stop <= first:
+                return None
+            
+            months = (first, stop)
+            if start < first:
+                fringes.append((start, first - pd.Timedelta(1, 'ns')))
+            if stop <= end:
+                fringes.append((stop, end))
+        
+        # The cube and the raw rows of the fringes must come from the same dataset version
+        with self.table_lock.shared():
+            if self.aggregate_cube is None:
+                return None
+            if bounds is not None:
+                covered = self.aggregate_cube.whole_cell_test(bounds)
+                if covered is None:
+                    return None
+            cube_moments = self.aggregate_cube.aggregate(entities.parameter, covered, depth_bounds, months)
+            if cube_moments is None:
+                return None
+            
+            parts = [cube_moments]
+            digest = 'digest' in cube_moments
+            if covered is not None:
+                edges = copy.copy(entities)
+                if months is not None:
+                    edges.date, edges.date_range = None, (months[0], months[1] - pd.Timedelta(1, 'ns'))
+                parts.append(moments_of(self.read_edge_values(edges, bounds, covered), digest=digest))
+            
+            for fringe_start, fringe_end in fringes:
+                fringe = copy.copy(entities)
+                fringe.date, fringe.date_range = None, (fringe_start, fringe_end)
+                if self.data is not None:
+                    values = self.data[entities.parameter].to_numpy()[self.select_rows(fringe)]
+                else:
+                    values = self.read_matching_rows(fringe, [entities.parameter])[entities.parameter].to_numpy()
+                parts.append(moments_of(values, digest=digest))
+        
+        stats = moments_to_stats(merge_moments(parts))
+        edge_count = parts[1]['count'] if covered is not None else 0
+        logger.info(f"Aggregate cube answered {entities.parameter} statistics "
+                    f"({stats['count'] if stats else 0} values, {edge_count} from edge cells, "
+                    f"{len(fringes)} partial months from raw rows)")
+        return stats
+    
+    def read_edge_values(self, entities, bounds: Dict[str, Any], covered) -> np.ndarray:
+        """
+        Values of a query's parameter in the aggregate cube's edge cells.
+        
+        These are the rows inside the query's area that covered rejects.
+        With a resident table only the grid cells not wholly covered are
+        visited; a lazy dataset reads the area and drops the covered rows.
+        
+        Args:
+            entities: QueryEntity object, already limited to the cube's months
+            bounds: Bounds of the query's location
+            covered: AggregateCube.whole_cell_test of the bounds
+        
+        Returns:
+            Parameter values of the edge rows
+        """
+        parameter = entities.parameter
+        if self.data is None:
+            frame = self.read_matching_rows(entities, [parameter, 'latitude', 'longitude'])
+            keep = ~covered(frame['latitude'].to_numpy(), frame['longitude'].to_numpy())
+            return frame[parameter].to_numpy()[keep]
+        
+        if self.spatial_index is None:
+            rows = self.select_rows(entities)
+        else:
+            # Index cells lining up with cube cells can be skipped by their centre when wholly covered
+            degrees = self.aggregate_cube.cell_degrees
+            aligned = (self.spatial_index.cell_degrees == degrees
+                       and (90.0 / degrees).is_integer() and (180.0 / degrees).is_integer())
+            area = bounds['region'].bounds if 'region' in bounds else bounds
+            rows = self.spatial_index.query_cells(area['lat_min'], area['lat_max'], area['lon_min'], area['lon_max'],
+                                                  skip=covered if aligned else None)
+            
+            # Date, depth and parameter filters of the query, without its location
+            unplaced = copy.copy(entities)
+            unplaced.location = None
+            start, stop, _, evaluate = self.plan_selection(unplaced)
+            rows = rows[np.searchsorted(rows, start):np.searchsorted(rows, stop)]
+            if evaluate is not None:
+                rows = rows[evaluate(rows)]
+            
+            latitude = self.data['latitude'].to_numpy()[rows]
+            longitude = self.data['longitude'].to_numpy()[rows]
+            if 'region' in bounds:
+                in_area = bounds['region'].contains(latitude, longitude)
+            else:
+                in_area = ((latitude >= bounds['lat_min']) & (latitude <= bounds['lat_max'])
+                           & longitude_mask(longitude, bounds['lon_min'], bounds['lon_max']))
+            rows = rows[in_area]
+        
+        latitude = self.data['latitude'].to_numpy()[rows]
+        longitude = self.data['longitude'].to_numpy()[rows]
+        return self.data[parameter].to_numpy()[rows][~covered(latitude, longitude)]
+    
+    def get_profile(self, float_id: str, profile_id: int) -> pd.DataFrame:
+        """
+        Fetch a whole vertical profile from the profile store.
+        
+        Args:
+            float_id: Float identifier
+            profile_id: Profile (cycle) number as used in the master dataset
+        
+        Returns:
+            DataFrame with one row per level, empty if unavailable
+        """
+        if self.profile_store is None:
+            logger.warning("No profile store available, run consolidation with --profile-store")
+            return pd.DataFrame()
+        
+        return self.profile_store.get_profile(float_id, profile_id)
+    
+    def get_float_profiles(self, float_id: str, profile_ids: List[int] = None) -> pd.DataFrame:
+        """
+        Fetch all (or selected) vertical profiles of a float from the profile store.
+        
+        Args:
+            float_id: Float identifier
+            profile_ids: Optional subset of profile numbers
+        
+        Returns:
+            DataFrame with one row per level, empty if unavailable
+        """
+        if self.profile_store is None:
+            logger.warning("No profile store available, run consolidation with --profile-store")
+            return pd.DataFrame()
+        
+        return self.profile_store.get_float_profiles(float_id, profile_ids)
@@ -0,0 +1,177 @@
+"""
+Regions for FloatChat
+Polygon (and multi-polygon) query regions with vectorized containment tests.
+"""
+
+import numpy as np
+import logging
+from typing import Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Cell classes returned by Region.classify_cells
+CELL_OUTSIDE = 0
+CELL_INSIDE = 1
+CELL_EDGE = 2
+
+def wrap_longitude(longitude: float) -> float:
+    """Map a longitude into [-180, 180], leaving values already in range untouched"""
+    if -180.0 <= longitude <= 180.0:
+        return float(longitude)
+    return float((longitude + 180.0) % 360.0 - 180.0)
+
+def longitude_ranges(lon_min: float, lon_max: float) -> List[Tuple[float, float]]:
+    """
+    Split a longitude interval into plain ranges within [-180, 180].
+    
+    An interval crossing the antimeridian, given either with lon_min > lon_max
+    (e.g. 170..-170) or with bounds beyond ±180 (e.g. 170..190), becomes two
+    ranges, one on each side of it.
+    
+    Args:
+        lon_min: Western bound
+        lon_max: Eastern bound
+    
+    Returns:
+        List of one or two (low, high) ranges
+    """
+    if lon_max - lon_min >= 360.0:
+        return [(-180.0, 180.0)]
+    
+    low, high = wrap_longitude(lon_min), wrap_longitude(lon_max)
+    if low <= high:
+        return [(low, high)]
+    return [(low, 180.0), (-180.0, high)]
+
+def longitude_mask(longitude: np.ndarray, lon_min: float, lon_max: float) -> np.ndarray:
+    """Vectorized test of longitudes against a possibly wrapping interval"""
+    mask = None
+    for low, high in longitude_ranges(lon_min, lon_max):
+        in_range = (longitude >= low) & (longitude <= high)
+        mask = in_range if mask is None else mask | in_range
+    return mask
+
+class Region:
+    """Named area bounded by one or more rings of (lon, lat) vertices"""
+    
+    def __init__(self, name: str, rings: Sequence[Sequence[Sequence[float]]]):
+        """
+        Args:
+            name: Region name
+            rings: Closed or open rings of [lon, lat] vertices. Rings combine
+                with the even-odd rule, so disjoint rings form a multi-polygon
+                and a ring inside another cuts a hole (e.g. an island).
+                Regions crossing the antimeridian use longitudes beyond ±180
+                (e.g. 120..290 for the Pacific)
+        """
+        self.name = name
+        self.rings: List[np.ndarray] = []
+        for ring in rings:
+            vertices = np.asarray(ring, dtype=np.float64)
+            if not np.array_equal(vertices[0], vertices[-1]):
+                vertices = np.vstack([vertices, vertices[:1]])
+            self.rings.append(vertices)
+        
+        vertices = np.vstack(self.rings)
+        self.bounds: Dict[str, float] = {
+            'lat_min': float(vertices[:, 1].min()),
+            'lat_max': float(vertices[:, 1].max()),
+            'lon_min': float(vertices[:, 0].min()),
+            'lon_max': float(vertices[:, 0].max()),
+        }
+        self._cell_classes = {}
+    
+    def _edges(self):
+        for ring in self.rings:
+            for (x0, y0), (x1, y1) in zip(ring[:-1], ring[1:]):
+                yield x0, y0, x1, y1
+    
+    def contains(self, latitude: np.ndarray, longitude: np.ndarray) -> np.ndarray:
+        """
+        Even-odd point-in-polygon test, vectorized over points.
+        
+        Args:
+            latitude: Point latitudes
+            longitude: Point longitudes in [-180, 180]
+        
+        Returns:
+            Boolean array, True for points inside the region
+        """
+        lat = np.asarray(latitude, dtype=np.float64)
+        lon = np.asarray(longitude, dtype=np.float64)
+        inside = self._contains(lat, lon)
+        
+        # Outlines drawn across the antimeridian are also tested one turn over
+        if self.bounds['lon_max'] > 180.0:
+            inside |= self._contains(lat, lon + 360.0)
+        if self.bounds['lon_min'] < -180.0:
+            inside |= self._contains(lat, lon - 360.0)
+        return inside
+    
+    def _contains(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        inside = np.zeros(lat.shape, dtype=bool)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for x0, y0, x1, y1 in self._edges():
+                if y0 == y1:
+                    continue
+                crosses = (y0 > lat) != (y1 > lat)
+                x_cross = x0 + (lat - y0) * (x1 - x0) / (y1 - y0)
+                inside ^= crosses & (lon < x_cross)
+        
+        return inside
+    
+    def classify_cells(self, cell_degrees: float) -> Tuple[int, int, np.ndarray]:
+        """
+        Classify the grid cells covering the region's bounding box.
+        
+        Cells crossed (or touched) by an edge are CELL_EDGE; the others are
+        wholly inside or outside and are classified by their centre. The grid
+        matches SpatialGridIndex: cell (i, j) spans latitude
+        [-90 + i*d, -90 + (i+1)*d) and longitude [-180 + j*d, -180 + (j+1)*d);
+        for outlines beyond ±180, j runs past the grid and wraps around it.
+        
+        Args:
+            cell_degrees: Grid cell size in degrees
+        
+        Returns:
+            (first lat cell, first lon cell, 2-D array of cell classes)
+        """
+        if cell_degrees in self._cell_classes:
+            return self._cell_classes[cell_degrees]
+        
+        def cell_of(value, origin):
+            return int(np.floor((value - origin) / cell_degrees))
+        
+        lat_start, lat_stop = cell_of(self.bounds['lat_min'], -90.0), cell_of(self.bounds['lat_max'], -90.0)
+        lon_start, lon_stop = cell_of(self.bounds['lon_min'], -180.0), cell_of(self.bounds['lon_max'], -180.0)
+        classes = np.zeros((lat_stop - lat_start + 1, lon_stop - lon_start + 1), dtype=np.int8)
+        
+        for x0, y0, x1, y1 in self._edges():
+            rows = np.arange(cell_of(min(y0, y1), -90.0), cell_of(max(y0, y1), -90.0) + 1)
+            cols = np.arange(cell_of(min(x0, x1), -180.0), cell_of(max(x0, x1), -180.0) + 1)
+            bottom = (-90.0 + rows * cell_degrees)[:, None]
+            left = (-180.0 + cols * cell_degrees)[None, :]
+            
+            # The edge crosses a cell unless all four corners lie strictly on one side of it
+            sides = [
+                (x1 - x0) * (y - y0) - (y1 - y0) * (x - x0)
+                for y in (bottom, bottom + cell_degrees)
+                for x in (left, left + cell_degrees)
+            ]
+            low = np.minimum.reduce(sides)
+            high = np.maximum.reduce(sides)
+            crossed = (low <= 0) & (high >= 0)
+            block = classes[rows[0] - lat_start:rows[-1] - lat_start + 1, cols[0] - lon_start:cols[-1] - lon_start + 1]
+            block[crossed] = CELL_EDGE
+        
+        rows, cols = np.nonzero(classes != CELL_EDGE)
+        centre_lat = -90.0 + (rows + lat_start + 0.5) * cell_degrees
+        centre_lon = -180.0 + (cols + lon_start + 0.5) * cell_degrees
+        classes[rows, cols] = np.where(self.contains(centre_lat, centre_lon), CELL_INSIDE, CELL_OUTSIDE)
+        
+        result = (lat_start, lon_start, classes)
+        self._cell_classes[cell_degrees] = result
+        logger.info(f"Classified {classes.size} {cell_degrees:g}° cells of region '{self.name}': "
+                    f"{int((classes == CELL_INSIDE).sum())} inside, {int((classes == CELL_EDGE).sum())} edge")
+        return result
@@ -0,0 +1,87 @@
+"""
+Result Cache for FloatChat
+Byte-bounded LRU cache with expiry for query results.
+"""
+
+import pandas as pd
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """LRU cache of query results with a byte budget and a time-to-live"""
+    
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        """
+        Create an empty cache.
+        
+        Args:
+            max_bytes: Total size of cached results before the least recently
+                used entries are evicted
+            ttl_seconds: Lifetime of an entry; 0 or None disables expiry
+        """
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # Streamlit sessions share one QueryEngine across threads
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def size_of(value: Any) -> int:
+        """Approximate memory footprint of a cached value in bytes"""
+        if isinstance(value, pd.DataFrame):
+            return int(value.memory_usage(deep=True, index=True).sum())
+        return 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl_seconds and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+    
+    def put(self, key: Hashable, value: Any):
+        """Store a value, evicting least recently used entries to fit the budget"""
+        size = self.size_of(value)
+        if size > self.max_bytes:
+            logger.info(f"Result of {size} bytes exceeds the cache budget, not cached")
+            return
+        
+        expires = time.monotonic() + self.ttl_seconds if self.ttl_seconds else float('inf')
+        with self._lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (expires, size, value)
+            self.current_bytes += size
+            
+            while self.current_bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+    
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self.entries.clear()
+            self.current_bytes = 0
+    
+    def _remove(self, key: Hashable):
+        _, size, _ = self.entries.pop(key)
+        self.current_bytes -= size
+    
+    def __len__(self) -> int:
+        return len(self.entries)
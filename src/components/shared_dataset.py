@@ -0,0 +1,266 @@
+"""
+Shared Dataset for FloatChat
+Columns of the resident table and its spatial index, published once per host in shared memory.
+
+Run the server next to the Streamlit processes (from the src directory):
+
+    python -m components.shared_dataset ../processed_data/master_dataset.parquet
+
+QueryEngine(shared_memory=True) then attaches to the published columns and index instead
+of loading and indexing its own copy of the dataset.
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Optional
+from .spatial_index import SpatialGridIndex
+
+logger = logging.getLogger(__name__)
+
+# Manifest describing the published segments, written next to the parquet file
+MANIFEST_SUFFIX = '.shm.json'
+
+# Seconds between the server's checks for a rewritten dataset
+SERVER_POLL_SECONDS = 30
+
+def get_manifest_path(data_path: str) -> str:
+    """Path of the shared-memory manifest belonging to a dataset file"""
+    return os.path.splitext(data_path)[0] + MANIFEST_SUFFIX
+
+def create_segment(name: str, array: np.ndarray) -> shared_memory.SharedMemory:
+    """New segment holding a copy of an array"""
+    segment = shared_memory.SharedMemory(name=name, create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[:] = array
+    return segment
+
+def open_segment(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing segment without handing it to this process's resource tracker"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 the tracker would unlink the segment when this process exits
+        segment = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
+
+class SharedDataset:
+    """Column arrays of a table, and of its spatial index, held in named shared memory segments"""
+    
+    def __init__(self, manifest: Dict, segments: List[shared_memory.SharedMemory], owner: bool):
+        """
+        Args:
+            manifest: Row count, source signature, per-column layout and spatial index layout
+            segments: Segments of the columns, then of the index arrays, in manifest order
+            owner: True in the publishing process, which unlinks the segments on close
+        """
+        self.manifest = manifest
+        self.segments = segments
+        self.owner = owner
+    
+    @classmethod
+    def publish(cls, data: pd.DataFrame, manifest_path: str, source_signature, generation: int = 0,
+                spatial_index: SpatialGridIndex = None) -> 'SharedDataset':
+        """
+        Copy a table's columns into new shared memory segments and write the manifest.
+        
+        Args:
+            data: Table in the storage dtypes and date order
+            manifest_path: Manifest file attaching processes read
+            source_signature: Signature of the dataset file the table was loaded from
+            generation: Number distinguishing republished versions of the table
+            spatial_index: Index built over data, published so attaching processes need not build their own
+        
+        Returns:
+            The owning SharedDataset
+        """
+        columns, segments, index_arrays = [], [], []
+        try:
+            for index, column in enumerate(data.columns):
+                entry = {'name': column}
+                values = data[column]
+                if isinstance(values.dtype, pd.CategoricalDtype):
+                    entry['categories'] = values.cat.categories.tolist()
+                    values = values.cat.codes
+                array = np.ascontiguousarray(values.to_numpy())
+                entry['dtype'] = array.dtype.str
+                
+                segment = create_segment(f"floatchat_{os.getpid()}_{generation}_{index}", array)
+                segments.append(segment)
+                entry['segment'] = segment.name
+                columns.append(entry)
+            
+            if spatial_index is not None:
+                for name, array in spatial_index.to_arrays().items():
+                    array = np.ascontiguousarray(array)
+                    segment = create_segment(f"floatchat_{os.getpid()}_{generation}_g{len(index_arrays)}", array)
+                    segments.append(segment)
+                    index_arrays.append({'name': name, 'dtype': array.dtype.str, 'length': len(array),
+                                         'segment': segment.name})
+        except Exception:
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+            raise
+        
+        manifest = {'rows': len(data), 'source_signature': list(source_signature), 'columns': columns}
+        if spatial_index is not None:
+            manifest['spatial_index'] = {'cell_degrees': spatial_index.cell_degrees, 'arrays': index_arrays}
+        
+        directory = os.path.dirname(os.path.abspath(manifest_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, manifest_path)
+        
+        total_bytes = sum(segment.size for segment in segments)
+        logger.info(f"Published {len(data)} records in {len(segments)} shared memory segments "
+                    f"({total_bytes / (1024*1024):.1f} MB), manifest {manifest_path}")
+        return cls(manifest, segments, owner=True)
+    
+    @classmethod
+    def attach(cls, manifest_path: str, source_signature=None) -> Optional['SharedDataset']:
+        """
+        Attach to the segments listed in a manifest.
+        
+        Args:
+            manifest_path: Manifest written by publish
+            source_signature: Signature of the dataset file the caller expects;
+                a table published from another version is not attached
+        
+        Returns:
+            SharedDataset, or None when nothing usable is published
+        """
+        if not os.path.exists(manifest_path):
+            return None
+        
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable shared dataset manifest {manifest_path}: {str(e)}")
+            return None
+        
+        if source_signature is not None and manifest['source_signature'] != list(source_signature):
+            logger.info(f"Shared dataset in {manifest_path} was published from another version of the file")
+            return None
+        
+        segments = []
+        try:
+            for entry in manifest['columns'] + manifest.get('spatial_index', {}).get('arrays', []):
+                segments.append(open_segment(entry['segment']))
+        except FileNotFoundError:
+            logger.warning(f"Shared dataset segments of {manifest_path} are gone (server stopped?)")
+            for segment in segments:
+                segment.close()
+            return None
+        
+        logger.info(f"Attached to shared dataset with {manifest['rows']} records from {manifest_path}")
+        return cls(manifest, segments, owner=False)
+    
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame over read-only views of the shared columns (nothing is copied)"""
+        rows = self.manifest['rows']
+        columns = {}
+        for entry, segment in zip(self.manifest['columns'], self.segments):
+            values = np.ndarray((rows,), dtype=np.dtype(entry['dtype']), buffer=segment.buf)
+            values.flags.writeable = False
+            if 'categories' in entry:
+                values = pd.Categorical.from_codes(values, categories=entry['categories'])
+            columns[entry['name']] = values
+        
+        return pd.DataFrame(columns, copy=False)
+    
+    def to_spatial_index(self, cell_degrees: float) -> Optional[SpatialGridIndex]:
+        """
+        Spatial index over read-only views of the shared index arrays.
+        
+        Args:
+            cell_degrees: Grid cell size the caller queries with
+        
+        Returns:
+            SpatialGridIndex, or None when none was published at that cell size
+        """
+        layout = self.manifest.get('spatial_index')
+        if layout is None or layout['cell_degrees'] != cell_degrees:
+            return None
+        
+        arrays = {}
+        index_segments = self.segments[len(self.manifest['columns']):]
+        for entry, segment in zip(layout['arrays'], index_segments):
+            values = np.ndarray((entry['length'],), dtype=np.dtype(entry['dtype']), buffer=segment.buf)
+            values.flags.writeable = False
+            arrays[entry['name']] = values
+        return SpatialGridIndex.from_arrays(arrays, layout['cell_degrees'])
+    
+    def close(self):
+        """Detach; the owner also removes the segments (attached processes keep their mappings)"""
+        for segment in self.segments:
+            segment.close()
+            if self.owner:
+                segment.unlink()
+        self.segments = []
+
+def serve(data_path: str, poll_seconds: float = SERVER_POLL_SECONDS):
+    """
+    Publish a dataset in shared memory and keep it current until stopped.
+    
+    The dataset is republished under new segment names when the file on disk
+    changes; the old segments are unlinked, and processes still attached to
+    them keep their mappings until they reload.
+    
+    Args:
+        data_path: Path to master_dataset.parquet
+        poll_seconds: Interval between checks for a rewritten file
+    """
+    from .query_engine import QueryEngine
+    
+    manifest_path = get_manifest_path(data_path)
+    shared, generation = None, 0
+    
+    def stop(signum, frame):
+        sys.exit(0)
+    signal.signal(signal.SIGTERM, stop)
+    
+    try:
+        # The engine loads the table in the storage dtypes and date order, as queries expect it
+        engine = QueryEngine(data_path, cache_max_bytes=0)
+        while True:
+            if engine.data is not None:
+                previous = shared
+                shared = SharedDataset.publish(engine.data, manifest_path, engine.data_signature[0], generation,
+                                               engine.spatial_index)
+                generation += 1
+                if previous is not None:
+                    previous.close()
+                
+                # Only the shared copy stays resident
+                engine.data, engine.sorted_dates, engine.spatial_index = None, None, None
+            
+            time.sleep(poll_seconds)
+            if engine.get_data_signature() != engine.data_signature:
+                logger.info(f"{data_path} changed on disk, republishing")
+                engine.load_data()
+    finally:
+        if shared is not None:
+            shared.close()
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+            logger.info("Shared dataset unpublished")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Serve the FloatChat master dataset from shared memory")
+    parser.add_argument('data_path', help="Path to master_dataset.parquet")
+    parser.add_argument('--poll-seconds', type=float, default=SERVER_POLL_SECONDS,
+                        help="Interval between checks for a rewritten dataset file")
+    args = parser.parse_args()
+    serve(args.data_path, args.poll_seconds)
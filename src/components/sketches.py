@@ -0,0 +1,174 @@
+"""
+Mergeable Summaries for FloatChat
+Moments and t-digest quantile sketches that combine across partitions.
+"""
+
+import numpy as np
+import math
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+# t-digest compression: about half this many centroids per stored summary
+DIGEST_COMPRESSION = 100
+
+# Compression of digests merged at query time. Merges of mixed regions can be
+# strongly multimodal, and a centroid straddling a gap between modes puts its
+# mean inside the gap; the merged digest is never stored, so it stays finer
+MERGED_DIGEST_COMPRESSION = 1000
+
+# Percentiles reported next to the median by moments_to_stats
+SUMMARY_PERCENTILES = (5, 25, 75, 95)
+
+def compress_centroids(groups: np.ndarray, means: np.ndarray, weights: np.ndarray,
+                       compression: float = DIGEST_COMPRESSION) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Merge weighted points into t-digest centroids, separately for every group.
+    
+    Raw values enter with weight 1; existing centroids of several digests
+    enter as they are, so the same call builds and merges digests. Points
+    are sorted by value and binned on the arcsine scale, which keeps the
+    centroids near either tail small and the quantiles there accurate.
+    
+    Args:
+        groups: Group code of every point
+        means: Point values (centroid means)
+        weights: Point weights (centroid counts)
+        compression: Digest size parameter
+    
+    Returns:
+        (groups, means, weights) of the centroids, ordered by group and mean
+    """
+    groups = np.asarray(groups, dtype=np.int64)
+    means = np.asarray(means, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    if len(means) == 0:
+        return groups, means, weights
+    
+    order = np.lexsort((means, groups))
+    groups, means, weights = groups[order], means[order], weights[order]
+    
+    # Quantile of every point's midpoint within its group
+    starts = np.flatnonzero(np.concatenate([[True], groups[1:] != groups[:-1]]))
+    cumulative = np.cumsum(weights)
+    totals = np.add.reduceat(weights, starts)
+    lengths = np.diff(np.append(starts, len(groups)))
+    group_start = np.repeat(cumulative[starts] - weights[starts], lengths)
+    q = (cumulative - weights / 2 - group_start) / np.repeat(totals, lengths)
+    
+    # Centroid boundaries at whole steps of the scale function k(q) = δ/2π · asin(2q - 1)
+    bins = np.floor(compression / (2 * math.pi) * np.arcsin(np.clip(2 * q - 1, -1.0, 1.0)))
+    boundaries = np.flatnonzero(np.concatenate([[True], (groups[1:] != groups[:-1]) | (bins[1:] != bins[:-1])]))
+    
+    merged_weights = np.add.reduceat(weights, boundaries)
+    merged_means = np.add.reduceat(means * weights, boundaries) / merged_weights
+    return groups[boundaries], merged_means, merged_weights
+
+def digest_of(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """t-digest centroids (means, weights) of raw values"""
+    values = np.asarray(values, dtype=np.float64)
+    _, means, weights = compress_centroids(np.zeros(len(values), dtype=np.int64), values, np.ones(len(values)))
+    return means, weights
+
+def digest_quantiles(means: np.ndarray, weights: np.ndarray, quantiles: Sequence[float],
+                     low: float = None, high: float = None) -> np.ndarray:
+    """
+    Approximate quantiles from t-digest centroids.
+    
+    Every centroid stands at the rank of its middle value and quantiles
+    interpolate between those ranks like numpy's linear percentile, so runs
+    of single values are answered exactly.
+    
+    Args:
+        means: Centroid means, in any order
+        weights: Centroid weights
+        quantiles: Quantiles in [0, 1]
+        low, high: Exact minimum and maximum, if known, to anchor the tails
+    
+    Returns:
+        Array of quantile estimates (NaN without centroids)
+    """
+    if len(means) == 0:
+        return np.full(len(quantiles), np.nan)
+    
+    order = np.argsort(means, kind='stable')
+    means, weights = means[order], weights[order]
+    last_rank = weights.sum() - 1
+    centres = np.cumsum(weights) - (weights + 1) / 2
+    
+    positions, values = centres, means
+    if low is not None and high is not None:
+        positions = np.concatenate([[0.0], centres, [last_rank]])
+        values = np.concatenate([[low], means, [high]])
+    return np.interp(np.asarray(quantiles, dtype=np.float64) * last_rank, positions, values)
+
+def moments_of(values: np.ndarray, digest: bool = False) -> Dict:
+    """
+    Count, sum, sum of squares, min and max of raw values (NaN ignored).
+    
+    Args:
+        values: Raw values
+        digest: Also sketch their distribution, for medians and percentiles
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        moments = {'count': 0, 'sum': 0.0, 'sumsq': 0.0, 'min': math.inf, 'max': -math.inf}
+    else:
+        moments = {
+            'count': len(values),
+            'sum': float(values.sum()),
+            'sumsq': float(np.square(values).sum()),
+            'min': float(values.min()),
+            'max': float(values.max()),
+        }
+    if digest:
+        moments['digest'] = digest_of(values)
+    return moments
+
+def merge_moments(parts: Iterable[Dict]) -> Dict:
+    """
+    Combine moments of disjoint sets of values.
+    
+    Digests are kept if every part has one, merged at MERGED_DIGEST_COMPRESSION.
+    """
+    merged = {'count': 0, 'sum': 0.0, 'sumsq': 0.0, 'min': math.inf, 'max': -math.inf}
+    digests = []
+    for part in parts:
+        merged['count'] += part['count']
+        merged['sum'] += part['sum']
+        merged['sumsq'] += part['sumsq']
+        merged['min'] = min(merged['min'], part['min'])
+        merged['max'] = max(merged['max'], part['max'])
+        digests.append(part.get('digest'))
+    
+    if digests and all(digest is not None for digest in digests):
+        means = np.concatenate([digest[0] for digest in digests])
+        weights = np.concatenate([digest[1] for digest in digests])
+        _, means, weights = compress_centroids(np.zeros(len(means), dtype=np.int64), means, weights, MERGED_DIGEST_COMPRESSION)
+        merged['digest'] = (means, weights)
+    return merged
+
+def moments_to_stats(moments: Dict) -> Optional[Dict[str, float]]:
+    """
+    Turn merged moments into summary statistics.
+    
+    Returns:
+        count, mean, std (sample, like pandas), min and max, or None without
+        values. With a digest, also the approximate median and the
+        SUMMARY_PERCENTILES under 'percentiles'
+    """
+    count = moments['count']
+    if count == 0:
+        return None
+    
+    mean = moments['sum'] / count
+    std = math.sqrt(max(moments['sumsq'] - moments['sum'] * mean, 0.0) / (count - 1)) if count > 1 else math.nan
+    stats = {'count': int(count), 'mean': mean, 'std': std, 'min': moments['min'], 'max': moments['max']}
+    
+    if moments.get('digest') is not None:
+        means, weights = moments['digest']
+        quantiles = [0.5] + [percentile / 100 for percentile in SUMMARY_PERCENTILES]
+        values = digest_quantiles(means, weights, quantiles, moments['min'], moments['max'])
+        stats['median'] = float(values[0])
+        stats['percentiles'] = {percentile: float(value) for percentile, value in zip(SUMMARY_PERCENTILES, values[1:])}
+        stats['approximate'] = True
+    return stats
@@ -0,0 +1,218 @@
+"""
+Spatial Index for FloatChat
+Uniform lat/lon grid over the resident dataset for bounding-box lookups.
+"""
+
+import numpy as np
+import logging
+from typing import Callable, Dict, List, Tuple
+from .regions import Region, CELL_INSIDE, CELL_EDGE, longitude_ranges
+
+logger = logging.getLogger(__name__)
+
+class SpatialGridIndex:
+    """Row positions grouped by lat/lon grid cell (cell-sorted row ranges)"""
+    
+    # Arrays that make up a built index, as exported by to_arrays
+    ARRAY_NAMES = ('row_positions', 'cell_offsets', 'latitude', 'longitude')
+    
+    def __init__(self, latitude: np.ndarray, longitude: np.ndarray, cell_degrees: float = 1.0):
+        """
+        Build the grid over one table's positions.
+        
+        Args:
+            latitude: Latitude of every row
+            longitude: Longitude of every row
+            cell_degrees: Grid cell size in degrees
+        """
+        self._set_grid(cell_degrees)
+        n_cells = self.n_lat_cells * self.n_lon_cells
+        
+        latitude = np.asarray(latitude)
+        longitude = np.asarray(longitude)
+        lat_cells = self._lat_cell(latitude)
+        lon_cells = self._lon_cell(longitude)
+        
+        # Rows without a position go to a trailing bucket that no query touches
+        cells = lat_cells.astype(np.int64) * self.n_lon_cells + lon_cells
+        cells[np.isnan(latitude) | np.isnan(longitude)] = n_cells
+        
+        self.row_positions = np.argsort(cells, kind='stable')
+        self.cell_offsets = np.zeros(n_cells + 2, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=n_cells + 1), out=self.cell_offsets[1:])
+        
+        # Positions in cell order, so edge cells are refined on contiguous memory
+        self.latitude = latitude[self.row_positions]
+        self.longitude = longitude[self.row_positions]
+        
+        logger.info(f"Built {self.cell_degrees:g}° spatial grid index over {len(cells)} rows "
+                    f"({int(np.count_nonzero(np.diff(self.cell_offsets[:-1])))} occupied cells)")
+    
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], cell_degrees: float) -> 'SpatialGridIndex':
+        """
+        Wrap the arrays of an index built elsewhere, without copying them.
+        
+        Args:
+            arrays: ARRAY_NAMES arrays, e.g. views of shared memory segments
+            cell_degrees: Grid cell size the arrays were built with
+        
+        Returns:
+            SpatialGridIndex answering queries from the given arrays
+        """
+        index = cls.__new__(cls)
+        index._set_grid(cell_degrees)
+        for name in cls.ARRAY_NAMES:
+            setattr(index, name, arrays[name])
+        return index
+    
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """The arrays making up the index, for from_arrays"""
+        return {name: getattr(self, name) for name in self.ARRAY_NAMES}
+    
+    def _set_grid(self, cell_degrees: float):
+        self.cell_degrees = float(cell_degrees)
+        self.n_lat_cells = int(np.ceil(180.0 / self.cell_degrees))
+        self.n_lon_cells = int(np.ceil(360.0 / self.cell_degrees))
+    
+    def _lat_cell(self, latitude):
+        cells = np.floor((np.nan_to_num(latitude) + 90.0) / self.cell_degrees)
+        return np.clip(cells, 0, self.n_lat_cells - 1).astype(np.int64)
+    
+    def _lon_cell(self, longitude):
+        cells = np.floor((np.nan_to_num(longitude) + 180.0) / self.cell_degrees)
+        return np.clip(cells, 0, self.n_lon_cells - 1).astype(np.int64)
+    
+    def _cell_range(self, lat_cell: int, lon_start: int, lon_stop: int) -> Tuple[int, int]:
+        """Sorted-order slice covering lon cells [lon_start, lon_stop) of one lat row"""
+        first = lat_cell * self.n_lon_cells
+        return int(self.cell_offsets[first + lon_start]), int(self.cell_offsets[first + lon_stop])
+    
+    def query(self, lat_min: float, lat_max: float, lon_min: float, lon_max: float) -> np.ndarray:
+        """
+        Find the rows inside an inclusive bounding box.
+        
+        Cells fully inside the box are taken whole; only rows in the boundary
+        cells are compared against the box, so the cost follows the hit count.
+        A box crossing the antimeridian (lon_min > lon_max, or bounds beyond
+        ±180) is answered as two boxes, one on each side.
+        
+        Args:
+            lat_min, lat_max, lon_min, lon_max: Box bounds in degrees
+        
+        Returns:
+            Ascending row positions into the indexed table
+        """
+        if lat_min > lat_max:
+            return np.empty(0, dtype=np.int64)
+        
+        ranges = longitude_ranges(lon_min, lon_max)
+        if len(ranges) > 1:
+            return self._sorted_rows([self.query(lat_min, lat_max, low, high) for low, high in ranges])
+        lon_min, lon_max = ranges[0]
+        
+        lat_start, lat_stop = int(self._lat_cell(lat_min)), int(self._lat_cell(lat_max))
+        lon_start, lon_stop = int(self._lon_cell(lon_min)), int(self._lon_cell(lon_max))
+        
+        parts: List[np.ndarray] = []
+        
+        def refine(start, stop):
+            if stop > start:
+                lat = self.latitude[start:stop]
+                lon = self.longitude[start:stop]
+                inside = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+                parts.append(self.row_positions[start:stop][inside])
+        
+        for lat_cell in range(lat_start, lat_stop + 1):
+            if lat_start < lat_cell < lat_stop and lon_stop - lon_start > 1:
+                # Interior row: edge lon cells are refined, the cells between them are inside
+                refine(*self._cell_range(lat_cell, lon_start, lon_start + 1))
+                start, stop = self._cell_range(lat_cell, lon_start + 1, lon_stop)
+                parts.append(self.row_positions[start:stop])
+                refine(*self._cell_range(lat_cell, lon_stop, lon_stop + 1))
+            else:
+                refine(*self._cell_range(lat_cell, lon_start, lon_stop + 1))
+        
+        return self._sorted_rows(parts)
+    
+    def query_cells(self, lat_min: float, lat_max: float, lon_min: float, lon_max: float,
+                    skip: Callable[[np.ndarray, np.ndarray], np.ndarray] = None) -> np.ndarray:
+        """
+        Find the rows of every grid cell overlapping a box, without testing them against it.
+        
+        Args:
+            lat_min, lat_max, lon_min, lon_max: Box bounds in degrees
+            skip: Function of the cell centres (latitude, longitude), True for
+                cells to leave out
+        
+        Returns:
+            Ascending row positions into the indexed table
+        """
+        if lat_min > lat_max:
+            return np.empty(0, dtype=np.int64)
+        
+        parts = []
+        lat_cells = np.arange(int(self._lat_cell(lat_min)), int(self._lat_cell(lat_max)) + 1)
+        for low, high in longitude_ranges(lon_min, lon_max):
+            lon_cells = np.arange(int(self._lon_cell(low)), int(self._lon_cell(high)) + 1)
+            cells = (lat_cells[:, None] * self.n_lon_cells + lon_cells[None, :]).ravel()
+            if skip is not None:
+                centre_lat = -90.0 + (cells // self.n_lon_cells + 0.5) * self.cell_degrees
+                centre_lon = -180.0 + (cells % self.n_lon_cells + 0.5) * self.cell_degrees
+                cells = cells[~skip(centre_lat, centre_lon)]
+            parts.append(self.row_positions[self._gather_cells(cells)])
+        return self._sorted_rows(parts)
+    
+    def _gather_cells(self, cells: np.ndarray) -> np.ndarray:
+        """Sorted-order offsets of every row in the given cells"""
+        starts = self.cell_offsets[cells]
+        lengths = self.cell_offsets[cells + 1] - starts
+        if lengths.sum() == 0:
+            return np.empty(0, dtype=np.int64)
+        
+        # Concatenated aranges: each cell's run of offsets, without a Python loop
+        run_starts = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        return run_starts + np.arange(lengths.sum())
+    
+    def query_region(self, region: Region) -> np.ndarray:
+        """
+        Find the rows inside a polygon region.
+        
+        Grid cells wholly inside the region are taken whole; the exact
+        point-in-polygon test runs only on rows of cells crossed by its edges.
+        
+        Args:
+            region: Region to test
+        
+        Returns:
+            Ascending row positions into the indexed table
+        """
+        lat_start, lon_start, classes = region.classify_cells(self.cell_degrees)
+        lat_cells, lon_cells = np.nonzero(classes)
+        lat_cells = lat_cells + lat_start
+        lon_cells = (lon_cells + lon_start) % self.n_lon_cells
+        
+        in_grid = (lat_cells >= 0) & (lat_cells < self.n_lat_cells)
+        cells = (lat_cells * self.n_lon_cells + lon_cells)[in_grid]
+        kinds = classes[np.nonzero(classes)][in_grid]
+        
+        inside = self._gather_cells(cells[kinds == CELL_INSIDE])
+        edge = self._gather_cells(cells[kinds == CELL_EDGE])
+        edge = edge[region.contains(self.latitude[edge], self.longitude[edge])]
+        
+        return self._sorted_rows([self.row_positions[inside], self.row_positions[edge]])
+    
+    def _sorted_rows(self, parts: List[np.ndarray]) -> np.ndarray:
+        """Merge row position lists into one ascending array"""
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        
+        rows = np.concatenate(parts)
+        if len(rows) * 16 < len(self.row_positions):
+            return np.sort(rows)
+        
+        # Large hit sets: scattering into a mask is cheaper than sorting
+        hits = np.zeros(len(self.row_positions), dtype=bool)
+        hits[rows] = True
+        return np.flatnonzero(hits)
@@ -0,0 +1,48 @@
+"""
+Table Lock for FloatChat
+Shared/exclusive lock guarding the QueryEngine's resident table during reloads.
+"""
+
+import threading
+from contextlib import contextmanager
+
+class TableLock:
+    """Held shared by running queries and exclusively while a reloaded table is swapped in"""
+    
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+    
+    @contextmanager
+    def shared(self):
+        """Hold the lock for one query; not reentrant while a swap is waiting"""
+        with self._condition:
+            # A waiting swap goes first, so a steady stream of queries cannot starve it
+            while self._writer or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+    
+    @contextmanager
+    def exclusive(self):
+        """Hold the lock alone, once every running query has finished"""
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
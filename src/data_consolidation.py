@@ -10,18 +10,213 @@ Phase 1 of the FloatChat project as per the plan:
 """
 
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import os
+import argparse
+import hashlib
+import json
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import logging
+from components.sketches import compress_centroids
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Per-float source files tracked by the incremental manifest
+SOURCE_FILES = ('measurements.parquet', 'trajectory.parquet', 'full_profile_data.parquet')
+MANIFEST_VERSION = 1
+
+# Partitioned dataset layout: hive keys year/month plus a lat/lon cell of this size
+PARTITION_CELL_DEGREES = 10
+PARTITION_COLUMNS = ['year', 'month', 'lat_cell', 'lon_cell']
+PARTITION_METADATA_KEY = b'floatchat.partition_cell_degrees'
+
+# Output ordering: plain date order, or a Z-order (Morton) curve over time/lat/lon
+# that keeps nearby points in the same row groups for min/max statistics pruning
+SORT_ORDERS = ('date', 'zorder')
+SORT_ORDER_METADATA_KEY = b'floatchat.sort_order'
+ZORDER_KEY_COLUMN = 'zorder_key'
+ZORDER_BITS = 21
+ZORDER_TIME_RANGE = (pd.Timestamp('1997-01-01'), pd.Timestamp('2050-01-01'))
+
+# Profile store: one row per vertical profile with per-level list columns
+PROFILE_LEVEL_COLUMNS = {
+    'pressure': 'PRES',
+    'temperature': 'TEMP',
+    'salinity': 'PSAL',
+    'pressure_adjusted': 'PRES_ADJUSTED',
+    'temperature_adjusted': 'TEMP_ADJUSTED',
+    'salinity_adjusted': 'PSAL_ADJUSTED',
+}
+PROFILE_QC_COLUMNS = {
+    'pressure_qc': 'PRES_QC',
+    'temperature_qc': 'TEMP_QC',
+    'salinity_qc': 'PSAL_QC',
+    'pressure_adjusted_qc': 'PRES_ADJUSTED_QC',
+    'temperature_adjusted_qc': 'TEMP_ADJUSTED_QC',
+    'salinity_adjusted_qc': 'PSAL_ADJUSTED_QC',
+}
+PROFILE_STORE_ROW_GROUP = 128
+PROFILE_STORE_FILE_NAME = 'profile_store.parquet'
+
+# File key-value metadata of the profile store: content hash of the profile
+# file of every float packed into it, so an outdated store is rebuilt
+PROFILE_SOURCES_KEY = b'floatchat.profile_sources'
+PROFILE_SOURCE_FILE = 'full_profile_data.parquet'
+
+# Storage schema of the master dataset; other columns keep their inferred type
+STORAGE_TYPES = {
+    'float_id': pa.dictionary(pa.int32(), pa.string()),
+    'profile_id': pa.int32(),
+    'date': pa.timestamp('ns'),
+    'latitude': pa.float32(),
+    'longitude': pa.float32(),
+    'pressure': pa.float32(),
+    'temperature': pa.float32(),
+    'salinity': pa.float32(),
+}
+# Merge artifacts that are not written to the master dataset
+STORAGE_DROP_COLUMNS = ('index',)
+
+# Streaming writer defaults: rows per row group / merge buffer, runs merged per pass
+STREAM_BATCH_ROWS = 65536
+MERGE_FAN_IN = 64
+
+# Aggregate cube: per-parameter moments and t-digests by lat/lon cell, month and pressure band.
+# Band edges are in dbar; pressures below the first or above the last edge get
+# open-ended bands of their own
+CUBE_CELL_DEGREES = 1
+CUBE_PRESSURE_EDGES = (0, 10, 20, 50, 100, 200, 300, 500, 700, 1000, 1500, 2000)
+CUBE_PARAMETERS = ('temperature', 'salinity', 'pressure')
+CUBE_KEY_COLUMNS = ['lat_min', 'lat_max', 'lon_min', 'lon_max', 'month', 'pressure_min', 'pressure_max']
+CUBE_METADATA_KEY = b'floatchat.aggregate_cube'
+CUBE_FILE_NAME = 'aggregate_cube.parquet'
+
+# Identity (inode, size, mtime) of the consolidated file a derived output was
+# built from; QueryEngine only uses outputs built from the file it loads
+SOURCE_SIGNATURE_KEY = b'floatchat.source_signature'
+
+def load_profile_positions(float_dir_path):
+    """
+    Load one position and time per profile from full_profile_data.parquet.
+    
+    Args:
+        float_dir_path (str): Path to float directory containing parquet files
+        
+    Returns:
+        pd.DataFrame: profile_id, date, latitude, longitude (one row per
+        profile, in profile order), or None if the file is missing
+    """
+    profile_path = os.path.join(float_dir_path, 'full_profile_data.parquet')
+    if not os.path.exists(profile_path):
+        return None
+    
+    levels = pd.read_parquet(profile_path, columns=['profile_index', 'CYCLE_NUMBER', 'JULD', 'LATITUDE', 'LONGITUDE'])
+    profiles = levels.drop_duplicates('profile_index').sort_values('profile_index')
+    
+    # CYCLE_NUMBER is the profile_id used by measurements.parquet
+    cycle = profiles['CYCLE_NUMBER'].to_numpy(dtype=np.float64)
+    profile_id = np.where(np.isnan(cycle), profiles['profile_index'].to_numpy() + 1, cycle).astype(np.int64)
+    
+    return pd.DataFrame({
+        'profile_id': profile_id,
+        'date': pd.to_datetime(profiles['JULD'].to_numpy(dtype=np.int64), unit='ns'),
+        'latitude': profiles['LATITUDE'].to_numpy(dtype=np.float64),
+        'longitude': profiles['LONGITUDE'].to_numpy(dtype=np.float64),
+    }).drop_duplicates('profile_id')
+
+def gather_rows(measurements, source, rows):
+    """
+    Copy source columns onto measurement rows by row position.
+    
+    Args:
+        measurements (pd.DataFrame): Measurement rows
+        source (pd.DataFrame): Per-profile rows (trajectory or profile positions)
+        rows (np.ndarray): Source row position for each measurement, -1 if none
+        
+    Returns:
+        pd.DataFrame: Measurements with the source columns appended; rows
+        without a source position get missing values, as with a left merge
+    """
+    found = (rows >= 0) & (len(source) > 0)
+    all_found = bool(found.all())
+    positions = np.where(found, rows, 0)
+    
+    columns = {}
+    for column in source.columns:
+        if column in measurements.columns:
+            continue
+        values = source[column].to_numpy()
+        gathered = pd.Series(values[positions] if len(source) else np.full(len(rows), np.nan),
+                             index=measurements.index)
+        columns[column] = gathered if all_found else gathered.where(found)
+    
+    return measurements.assign(**columns)
+
+def join_trajectory(measurements, trajectory, float_dir_path=''):
+    """
+    Attach trajectory positions to measurements with a positional gather.
+    
+    Trajectory row i holds profile i + 1, so each measurement's profile_id maps
+    straight to a row position without a hash join.
+    
+    Args:
+        measurements (pd.DataFrame): Measurement rows with a profile_id column
+        trajectory (pd.DataFrame): One row per profile, in profile order
+        float_dir_path (str): Float directory, used in log messages
+        
+    Returns:
+        pd.DataFrame: Measurements with the trajectory columns (and its
+        original row label as 'index'); out-of-range profile ids get missing
+        positions and are reported
+    """
+    profile_ids = pd.to_numeric(measurements['profile_id'], errors='coerce').to_numpy(dtype=np.float64)
+    rows = np.nan_to_num(profile_ids, nan=0.0).astype(np.int64) - 1
+    valid = np.isfinite(profile_ids) & (profile_ids == rows + 1) & (rows >= 0) & (rows < len(trajectory))
+    
+    if not valid.all():
+        bad_ids = pd.unique(measurements['profile_id'].to_numpy()[~valid])
+        logger.warning(f"{(~valid).sum()} measurements in {float_dir_path} reference {len(bad_ids)} profile ids "
+                       f"outside trajectory rows 1..{len(trajectory)} (e.g. {bad_ids[:5].tolist()})")
+    
+    return gather_rows(measurements, trajectory.reset_index(), np.where(valid, rows, -1))
+
+def join_profile_positions(measurements, positions):
+    """
+    Attach per-profile positions to measurement rows with a vectorized lookup.
+    
+    Args:
+        measurements (pd.DataFrame): Measurement rows with a profile_id column
+        positions (pd.DataFrame): One row per profile with profile_id, date,
+            latitude and longitude
+        
+    Returns:
+        pd.DataFrame: Measurements with index, date, latitude and longitude
+        columns; rows without a matching profile get missing positions
+    """
+    rows = pd.Index(positions['profile_id']).get_indexer(measurements['profile_id'])
+    
+    merged = gather_rows(measurements, positions, rows)
+    merged['index'] = rows
+    return merged
+
 def load_float_data(float_dir_path):
     """
     Load and merge measurements and trajectory data for a single float.
     
+    Floats without trajectory.parquet fall back to positions carried by the
+    measurement rows themselves or, failing that, to the per-profile
+    JULD/LATITUDE/LONGITUDE of full_profile_data.parquet.
+    
     Args:
         float_dir_path (str): Path to float directory containing parquet files
         
@@ -33,19 +228,31 @@ def load_float_data(float_dir_path):
         measurements_path = os.path.join(float_dir_path, 'measurements.parquet')
         trajectory_path = os.path.join(float_dir_path, 'trajectory.parquet')
         
-        if not os.path.exists(measurements_path) or not os.path.exists(trajectory_path):
-            logger.warning(f"Missing files in {float_dir_path}")
+        if not os.path.exists(measurements_path):
+            logger.warning(f"Missing measurements in {float_dir_path}")
             return None
             
         measurements = pd.read_parquet(measurements_path)
-        trajectory = pd.read_parquet(trajectory_path)
         
-        # Add trajectory sequence number for merging
-        trajectory = trajectory.reset_index()
-        trajectory['profile_id'] = trajectory.index + 1
+        if os.path.exists(trajectory_path):
+            trajectory = pd.read_parquet(trajectory_path)
+            
+            # Trajectory row i holds profile i + 1: join by position
+            merged_data = join_trajectory(measurements, trajectory, float_dir_path)
         
-        # Merge measurements with trajectory data
-        merged_data = pd.merge(measurements, trajectory, on='profile_id', how='left')
+        elif {'date', 'latitude', 'longitude'} <= set(measurements.columns):
+            logger.info(f"No trajectory in {float_dir_path}, using positions from measurements")
+            merged_data = measurements.copy()
+            merged_data['index'] = merged_data['profile_id'] - 1
+        
+        else:
+            positions = load_profile_positions(float_dir_path)
+            if positions is None:
+                logger.warning(f"Missing trajectory and full profile data in {float_dir_path}")
+                return None
+            
+            logger.info(f"No trajectory in {float_dir_path}, using profile positions from full_profile_data")
+            merged_data = join_profile_positions(measurements, positions)
         
         # Extract float_id from directory name
         float_id = os.path.basename(float_dir_path)
@@ -58,16 +265,916 @@ def load_float_data(float_dir_path):
         logger.error(f"Error processing {float_dir_path}: {str(e)}")
         return None
 
-def consolidate_data(data_root_dir, output_path):
+def list_float_dirs(data_dir):
+    """
+    List float directories in a stable order.
+    
+    Args:
+        data_dir (str): Directory containing one sub-directory per float
+        
+    Returns:
+        list: Sorted paths of the float directories
+    """
+    return [
+        os.path.join(data_dir, item)
+        for item in sorted(os.listdir(data_dir))
+        if os.path.isdir(os.path.join(data_dir, item))
+    ]
+
+def iter_float_data(float_paths, workers=1, loader=load_float_data):
+    """
+    Load float directories, optionally in a process pool.
+    
+    Results are yielded in the order of float_paths regardless of the worker
+    count, so serial and parallel runs produce identical output. At most
+    2 * workers floats are in flight at once to keep memory bounded.
+    
+    Args:
+        float_paths (list): Paths of the float directories to load
+        workers (int): Number of worker processes (1 = serial)
+        loader (callable): Module-level function loading one float directory
+        
+    Yields:
+        tuple: (float_path, loader result or None)
+    """
+    if workers <= 1:
+        for float_path in float_paths:
+            logger.info(f"Processing float: {os.path.basename(float_path)}")
+            yield float_path, loader(float_path)
+        return
+    
+    max_in_flight = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        paths = iter(float_paths)
+        
+        for float_path in paths:
+            pending.append((float_path, executor.submit(loader, float_path)))
+            if len(pending) >= max_in_flight:
+                break
+        
+        while pending:
+            float_path, future = pending.popleft()
+            yield float_path, future.result()
+            
+            # Top the window back up as each result is consumed
+            next_path = next(paths, None)
+            if next_path is not None:
+                pending.append((next_path, executor.submit(loader, next_path)))
+
+def _qc_strings(values, offsets):
+    """
+    Pack per-level QC flags into one string per profile, ARGO style ("11114").
+    
+    Args:
+        values (pd.Series): One QC flag per level (strings or numeric codes)
+        offsets (np.ndarray): int32 level offsets delimiting each profile
+        
+    Returns:
+        pa.StringArray: One string per profile with one character per level
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        codes = values.to_numpy(dtype=np.float64)
+        flags = np.where(np.isnan(codes), ' ', np.nan_to_num(codes).astype(np.int64).astype(str))
+    else:
+        flags = values.fillna(' ').astype(str).to_numpy(dtype=object)
+    
+    data = np.asarray(flags, dtype='S1').tobytes()
+    return pa.StringArray.from_buffers(len(offsets) - 1, pa.py_buffer(offsets), pa.py_buffer(data))
+
+def load_profile_data(float_dir_path):
+    """
+    Load full_profile_data.parquet of a float as one row per vertical profile.
+    
+    Levels are packed into float32 list columns and QC flags into one string
+    per profile, which keeps a whole profile in a single compact row keyed by
+    float_id and profile_id (the cycle number, matching measurements).
+    
+    Args:
+        float_dir_path (str): Path to float directory containing parquet files
+        
+    Returns:
+        pa.Table: Profiles sorted by profile_id, or None if unavailable
+    """
+    try:
+        profile_path = os.path.join(float_dir_path, 'full_profile_data.parquet')
+        if not os.path.exists(profile_path):
+            logger.warning(f"No full profile data in {float_dir_path}")
+            return None
+        
+        available = set(pq.read_schema(profile_path).names)
+        wanted = ['profile_index', 'level_index', 'CYCLE_NUMBER', 'DIRECTION', 'DATA_MODE',
+                  'JULD', 'LATITUDE', 'LONGITUDE', 'POSITION_QC']
+        wanted += list(PROFILE_LEVEL_COLUMNS.values()) + list(PROFILE_QC_COLUMNS.values())
+        levels = pd.read_parquet(profile_path, columns=[c for c in wanted if c in available])
+        levels = levels.sort_values(['profile_index', 'level_index'], kind='mergesort')
+        
+        # Profile boundaries in the level-sorted rows
+        profile_index = levels['profile_index'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, profile_index[1:] != profile_index[:-1]])
+        offsets = np.append(starts, len(profile_index)).astype(np.int32)
+        first = levels.iloc[starts]
+        
+        float_id = os.path.basename(float_dir_path)
+        cycle = first['CYCLE_NUMBER'].to_numpy(dtype=np.float64) if 'CYCLE_NUMBER' in first else np.full(len(first), np.nan)
+        profile_id = np.where(np.isnan(cycle), first['profile_index'].to_numpy() + 1, cycle).astype(np.int32)
+        
+        def dictionary(column):
+            values = first[column] if column in first else pd.Series([None] * len(first))
+            return pa.array(values.astype(object).where(values.notna(), None), pa.string()).dictionary_encode()
+        
+        columns = {
+            'float_id': pa.DictionaryArray.from_arrays(pa.array(np.zeros(len(first), np.int32)), pa.array([float_id])),
+            'profile_id': pa.array(profile_id),
+            'profile_index': pa.array(first['profile_index'].to_numpy(dtype=np.int32)),
+            'direction': dictionary('DIRECTION'),
+            'data_mode': dictionary('DATA_MODE'),
+            'date': pa.array(first['JULD'].to_numpy(dtype=np.int64)).cast(pa.timestamp('ns')),
+            'latitude': pa.array(first['LATITUDE'].to_numpy(dtype=np.float32)),
+            'longitude': pa.array(first['LONGITUDE'].to_numpy(dtype=np.float32)),
+            'position_qc': dictionary('POSITION_QC'),
+            'n_levels': pa.array(np.diff(offsets).astype(np.int16)),
+        }
+        for name, source in PROFILE_LEVEL_COLUMNS.items():
+            if source in levels:
+                values = pa.array(levels[source].to_numpy(dtype=np.float32))
+                columns[name] = pa.ListArray.from_arrays(pa.array(offsets), values)
+        for name, source in PROFILE_QC_COLUMNS.items():
+            if source in levels:
+                columns[name] = _qc_strings(levels[source], offsets)
+        
+        profiles = pa.table(columns).sort_by('profile_id')
+        logger.info(f"Packed float {float_id}: {profiles.num_rows} profiles from {len(levels)} levels")
+        return profiles
+        
+    except Exception as e:
+        logger.error(f"Error packing profiles of {float_dir_path}: {str(e)}")
+        return None
+
+def profile_store_sources(float_paths, manifest=None):
+    """
+    Content hashes of the profile files a profile store is built from.
+    
+    Args:
+        float_paths (list): Paths of the float directories
+        manifest (dict): Fingerprints recorded by consolidation, reused for
+            files whose size and mtime did not change
+        
+    Returns:
+        dict: Mapping of float_id to the SHA-256 of its profile file
+    """
+    manifest = manifest or {}
+    sources = {}
+    for float_path in float_paths:
+        float_id = os.path.basename(float_path)
+        file_path = os.path.join(float_path, PROFILE_SOURCE_FILE)
+        if os.path.exists(file_path):
+            previous = manifest.get(float_id, {}).get(PROFILE_SOURCE_FILE)
+            sources[float_id] = fingerprint_file(file_path, previous)['sha256']
+    return sources
+
+def profile_store_is_current(store_path, sources):
+    """True if the profile store exists and was built from exactly these profile files"""
+    try:
+        metadata = pq.read_metadata(store_path).metadata
+        return json.loads(metadata[PROFILE_SOURCES_KEY]) == sources
+    except (OSError, KeyError, ValueError, TypeError, pa.ArrowInvalid):
+        return False
+
+def build_profile_store(float_paths, store_path, workers=1, row_group_size=PROFILE_STORE_ROW_GROUP, sources=None):
+    """
+    Write the profile store, sorted by float_id and profile_id.
+    
+    Floats are packed (in parallel when workers > 1) and appended in path
+    order, so the file is ordered by key and a profile can be located from
+    the key columns alone and fetched by reading a single row group.
+    
+    Args:
+        float_paths (list): Paths of the float directories, sorted by float id
+        store_path (str): Destination parquet file
+        workers (int): Number of worker processes
+        row_group_size (int): Profiles per row group
+        sources (dict): profile_store_sources of float_paths, if already known
+    """
+    logger.info(f"Building profile store at {store_path}")
+    if sources is None:
+        sources = profile_store_sources(float_paths)
+    sources = dict(sources)
+    tmp_path = f"{store_path}.tmp"
+    writer = None
+    pending = []
+    pending_rows = 0
+    total_profiles = 0
+    
+    try:
+        for float_path, profiles in iter_float_data(float_paths, workers=workers, loader=load_profile_data):
+            if profiles is None:
+                # Not recorded as a source, so the next run packs it again
+                sources.pop(os.path.basename(float_path), None)
+                continue
+            
+            if writer is None:
+                schema = profiles.schema
+                writer = pq.ParquetWriter(tmp_path, schema, compression='zstd')
+            
+            pending.append(profiles.select(schema.names).cast(schema))
+            pending_rows += profiles.num_rows
+            total_profiles += profiles.num_rows
+            
+            # Write whole row groups and carry the remainder into the next float
+            if pending_rows >= row_group_size:
+                combined = pa.concat_tables(pending).unify_dictionaries()
+                full_rows = pending_rows - pending_rows % row_group_size
+                writer.write_table(combined.slice(0, full_rows), row_group_size=row_group_size)
+                pending = [combined.slice(full_rows)]
+                pending_rows -= full_rows
+        
+        if writer is None:
+            logger.error("No profile data found for the profile store")
+            return
+        
+        if pending_rows:
+            writer.write_table(pa.concat_tables(pending).unify_dictionaries(), row_group_size=row_group_size)
+        writer.add_key_value_metadata({PROFILE_SOURCES_KEY: json.dumps(sources, sort_keys=True).encode()})
+        writer.close()
+        writer = None
+        os.replace(tmp_path, store_path)
+        
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    logger.info(f"Profile store written: {total_profiles:,} profiles, "
+                f"{os.path.getsize(store_path) / (1024*1024):.2f} MB")
+
+def _cube_bins(values, low, high):
+    """
+    Cube bin bounds of each value.
+    
+    A value lying exactly on an edge gets the point bin (edge, edge); all
+    others get the open interval between their edges. Closed ranges with
+    bounds on edges are then exact unions of bins.
+    """
+    return low, np.where(values == low, low, high)
+
+def _cube_partials(frame, cell_degrees, pressure_edges):
+    """Per-parameter moments of one batch, grouped by the cube keys"""
+    edges = np.concatenate([[-np.inf], np.asarray(pressure_edges, dtype=np.float64), [np.inf]])
+    pressure = frame['pressure'].to_numpy(dtype=np.float64)
+    band = np.clip(np.searchsorted(edges, pressure, side='right') - 1, 0, len(edges) - 2)
+    
+    keys = {'month': frame['date'].to_numpy().astype('datetime64[M]').astype('datetime64[ns]')}
+    for axis in ('lat', 'lon'):
+        position = frame['latitude' if axis == 'lat' else 'longitude'].to_numpy(dtype=np.float64)
+        cell = np.floor(position / cell_degrees) * cell_degrees
+        keys[f'{axis}_min'], keys[f'{axis}_max'] = _cube_bins(position, cell, cell + cell_degrees)
+    keys['pressure_min'], keys['pressure_max'] = _cube_bins(pressure, edges[band], edges[band + 1])
+    
+    # Rows without a pressure still count towards requests without depth bounds
+    unbanded = np.isnan(pressure)
+    keys['pressure_min'] = np.where(unbanded, np.nan, keys['pressure_min'])
+    keys['pressure_max'] = np.where(unbanded, np.nan, keys['pressure_max'])
+    
+    keys = pd.DataFrame(keys)[CUBE_KEY_COLUMNS]
+    placed = keys.drop(columns=['pressure_min', 'pressure_max']).notna().all(axis=1).to_numpy()
+    
+    partials = []
+    for parameter in CUBE_PARAMETERS:
+        if parameter not in frame.columns:
+            continue
+        values = frame[parameter].to_numpy(dtype=np.float64)
+        valid = placed & ~np.isnan(values)
+        if not valid.any():
+            continue
+        
+        group = keys[valid].assign(parameter=parameter, value=values[valid], square=values[valid] ** 2)
+        cells = group.groupby(['parameter'] + CUBE_KEY_COLUMNS, sort=True, dropna=False)
+        moments = cells.agg(
+            count=('value', 'size'), sum=('value', 'sum'), sumsq=('square', 'sum'),
+            min=('value', 'min'), max=('value', 'max'),
+        ).reset_index()
+        
+        # Raw values enter the digests with weight 1
+        centroids = compress_centroids(cells.ngroup().to_numpy(), values[valid], np.ones(int(valid.sum())))
+        partials.append((moments, *centroids))
+    return partials
+
+def file_signature(path):
+    """Identity of a file on disk, in the form QueryEngine.get_data_signature uses"""
+    stat = os.stat(path)
+    return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+def aggregate_cube_is_current(cube_path, source_path):
+    """True if the aggregate cube exists and was built from the current source file"""
+    try:
+        metadata = json.loads(pq.read_schema(cube_path).metadata[CUBE_METADATA_KEY])
+        return metadata.get('source_signature') == file_signature(source_path)
+    except (OSError, KeyError, ValueError, TypeError, pa.ArrowInvalid):
+        return False
+
+def partitioned_dataset_is_current(partition_dir, source_path):
+    """True if the partitioned dataset exists and was written from the current source file"""
+    try:
+        metadata = pq.read_schema(os.path.join(partition_dir, '_common_metadata')).metadata
+        return json.loads(metadata[SOURCE_SIGNATURE_KEY]) == file_signature(source_path)
+    except (OSError, KeyError, ValueError, TypeError, pa.ArrowInvalid):
+        return False
+
+def build_aggregate_cube(source_path, cube_path, cell_degrees=CUBE_CELL_DEGREES,
+                         pressure_edges=CUBE_PRESSURE_EDGES, batch_rows=STREAM_BATCH_ROWS):
+    """
+    Precompute an aggregate cube of the consolidated dataset.
+    
+    For every parameter, grid cell, month and pressure band the cube holds
+    count, sum, sum of squares, min and max plus a t-digest of the values,
+    so mean/std/min/max and approximate medians and percentiles over any
+    union of cells can be combined without touching raw rows. Values lying
+    exactly on a cell or band edge are kept in cells of their own, so boxes
+    and depth ranges bounded by edges are covered exactly. Rows without a
+    pressure go to an unbanded bucket (NaN band bounds), which only requests
+    without depth bounds include. The source is streamed batch by batch;
+    rows without a position or date are left out.
+    
+    Args:
+        source_path (str): Consolidated parquet file
+        cube_path (str): Output parquet file
+        cell_degrees (float): Size of the lat/lon cells in degrees
+        pressure_edges (tuple): Ascending pressure band edges in dbar
+        batch_rows (int): Rows per scanned batch
+    """
+    signature = file_signature(source_path)
+    source = pq.ParquetFile(source_path)
+    columns = ['date', 'latitude', 'longitude'] + [
+        name for name in CUBE_PARAMETERS if name in source.schema_arrow.names
+    ]
+    
+    logger.info(f"Building aggregate cube at {cube_path} ({cell_degrees}° cells, "
+                f"{len(pressure_edges) + 1} pressure bands)")
+    partials = []
+    for batch in source.iter_batches(batch_size=batch_rows, columns=columns):
+        partials.extend(_cube_partials(batch.to_pandas(), cell_degrees, pressure_edges))
+        
+        # Fold partial groups together as they accumulate to bound memory
+        if len(partials) > 64:
+            partials = [_merge_cube_partials(partials)]
+    
+    if not partials:
+        logger.error(f"No rows to aggregate in {source_path}")
+        return
+    
+    cube, centroid_cells, centroid_means, centroid_weights = _merge_cube_partials(partials)
+    
+    # Centroids are ordered by cell, so each cell's digest is one slice of them
+    offsets = np.searchsorted(centroid_cells, np.arange(len(cube) + 1)).astype(np.int32)
+    table = pa.Table.from_pandas(cube, preserve_index=False)
+    table = table.append_column('centroid_means', pa.ListArray.from_arrays(offsets, centroid_means))
+    table = table.append_column('centroid_weights', pa.ListArray.from_arrays(offsets, centroid_weights))
+    metadata = {
+        'cell_degrees': cell_degrees,
+        'pressure_edges': list(pressure_edges),
+        'source_rows': source.metadata.num_rows,
+        'source_signature': signature,
+    }
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), CUBE_METADATA_KEY: json.dumps(metadata).encode()})
+    
+    tmp_path = f"{cube_path}.tmp"
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, cube_path)
+    
+    logger.info(f"Aggregate cube written: {len(cube):,} cells ({len(centroid_means):,} digest centroids) "
+                f"from {source.metadata.num_rows:,} rows, "
+                f"{os.path.getsize(cube_path) / (1024*1024):.2f} MB")
+
+def _merge_cube_partials(partials):
+    """
+    Combine partial cube groups that share keys.
+    
+    Each partial is (cells, centroid_cells, centroid_means, centroid_weights),
+    where centroid_cells holds the row of cells a digest centroid belongs to.
+    The result has the same form, with cells sorted by their keys.
+    """
+    offsets = np.cumsum([0] + [len(partial[0]) for partial in partials])
+    combined = pd.concat([partial[0] for partial in partials], ignore_index=True)
+    
+    cells = combined.groupby(['parameter'] + CUBE_KEY_COLUMNS, sort=True, dropna=False)
+    codes = cells.ngroup().to_numpy()
+    merged = cells.agg(
+        count=('count', 'sum'), sum=('sum', 'sum'), sumsq=('sumsq', 'sum'), min=('min', 'min'), max=('max', 'max'),
+    ).reset_index()
+    
+    centroid_cells = np.concatenate([codes[partial[1] + offset] for partial, offset in zip(partials, offsets)])
+    centroids = compress_centroids(
+        centroid_cells,
+        np.concatenate([partial[2] for partial in partials]),
+        np.concatenate([partial[3] for partial in partials]),
+    )
+    return (merged, *centroids)
+
+def get_manifest_path(output_path):
+    """Return the manifest path that accompanies a consolidated dataset"""
+    root, _ = os.path.splitext(str(output_path))
+    return f"{root}.manifest.json"
+
+def load_manifest(manifest_path):
+    """
+    Load a consolidation manifest.
+    
+    Args:
+        manifest_path (str): Path to the manifest JSON file
+        
+    Returns:
+        dict: Mapping of float_id to its recorded source file fingerprints
+    """
+    if not os.path.exists(manifest_path):
+        return {}
+    
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        
+        if manifest.get('version') != MANIFEST_VERSION:
+            logger.warning(f"Ignoring manifest with unsupported version: {manifest.get('version')}")
+            return {}
+        
+        return manifest.get('floats', {})
+        
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read manifest {manifest_path}: {str(e)}")
+        return {}
+
+def save_manifest(manifest_path, floats):
+    """
+    Write a consolidation manifest atomically.
+    
+    Args:
+        manifest_path (str): Path to the manifest JSON file
+        floats (dict): Mapping of float_id to source file fingerprints
+    """
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': MANIFEST_VERSION, 'floats': floats}, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def fingerprint_file(file_path, previous=None):
+    """
+    Fingerprint a source file by size, mtime and SHA-256 content hash.
+    
+    The hash is only recomputed when size or mtime differ from the previous
+    fingerprint, so unchanged files cost a single stat call.
+    
+    Args:
+        file_path (str): File to fingerprint
+        previous (dict): Fingerprint recorded by an earlier run, if any
+        
+    Returns:
+        dict: Fingerprint with size, mtime and sha256 keys
+    """
+    stat = os.stat(file_path)
+    
+    if previous and previous.get('size') == stat.st_size and previous.get('mtime') == stat.st_mtime_ns:
+        return dict(previous)
+    
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    
+    return {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+
+def fingerprint_float(float_path, previous=None):
+    """
+    Fingerprint the source files of a single float directory.
+    
+    Args:
+        float_path (str): Path to the float directory
+        previous (dict): Manifest entry recorded by an earlier run, if any
+        
+    Returns:
+        dict: Mapping of file name to fingerprint for files that exist
+    """
+    previous = previous or {}
+    fingerprints = {}
+    
+    for file_name in SOURCE_FILES:
+        file_path = os.path.join(float_path, file_name)
+        if os.path.exists(file_path):
+            fingerprints[file_name] = fingerprint_file(file_path, previous.get(file_name))
+    
+    return fingerprints
+
+def _same_content(old, new):
+    """Compare two float fingerprints by file set and content hash"""
+    if old is None or set(old) != set(new):
+        return False
+    return all(old[name]['sha256'] == new[name]['sha256'] for name in new)
+
+def _spread_bits_3d(values):
+    """Spread the low 21 bits of each value so two zero bits follow every bit"""
+    values = values.astype(np.uint64) & np.uint64(0x1fffff)
+    values = (values | (values << np.uint64(32))) & np.uint64(0x1f00000000ffff)
+    values = (values | (values << np.uint64(16))) & np.uint64(0x1f0000ff0000ff)
+    values = (values | (values << np.uint64(8))) & np.uint64(0x100f00f00f00f00f)
+    values = (values | (values << np.uint64(4))) & np.uint64(0x10c30c30c30c30c3)
+    values = (values | (values << np.uint64(2))) & np.uint64(0x1249249249249249)
+    return values
+
+def _quantize(values, low, high):
+    """Map values in [low, high] onto the integer grid used by the Z-order key"""
+    scale = (1 << ZORDER_BITS) - 1
+    normalized = (np.asarray(values, dtype=np.float64) - low) / (high - low)
+    return (np.clip(np.nan_to_num(normalized), 0.0, 1.0) * scale).astype(np.uint64)
+
+def zorder_key(latitude, longitude, dates):
+    """
+    Compute a 63-bit Z-order (Morton) key over time, latitude and longitude.
+    
+    Each dimension is quantized to 21 bits over a fixed domain, so keys can be
+    computed batch by batch and still sort consistently across floats.
+    
+    Args:
+        latitude: Array-like of latitudes in degrees
+        longitude: Array-like of longitudes in degrees
+        dates: Array-like of datetime64 values
+        
+    Returns:
+        np.ndarray: uint64 keys
+    """
+    time_low, time_high = (t.value for t in ZORDER_TIME_RANGE)
+    timestamps = np.asarray(dates, dtype='datetime64[ns]').astype(np.int64)
+    
+    return (
+        (_spread_bits_3d(_quantize(timestamps, time_low, time_high)) << np.uint64(2)) |
+        (_spread_bits_3d(_quantize(latitude, -90.0, 90.0)) << np.uint64(1)) |
+        _spread_bits_3d(_quantize(longitude, -180.0, 180.0))
+    )
+
+def sort_dataset(data, sort_order='date'):
+    """
+    Order a consolidated DataFrame for writing.
+    
+    Args:
+        data (pd.DataFrame): Consolidated rows
+        sort_order (str): 'date' or 'zorder'
+        
+    Returns:
+        pd.DataFrame: Sorted rows
+    """
+    if sort_order == 'zorder':
+        keys = zorder_key(data['latitude'].to_numpy(), data['longitude'].to_numpy(), data['date'].to_numpy())
+        return data.iloc[np.argsort(keys, kind='stable')]
+    return data.sort_values('date', kind='mergesort')
+
+def clean_float_batch(float_data, sort_order='date'):
+    """
+    Apply the per-row cleaning steps of consolidation to a single float.
+    
+    Args:
+        float_data (pd.DataFrame): Merged data of one float
+        sort_order (str): 'date' or 'zorder'; zorder adds the key column used
+            by the streaming merge
+        
+    Returns:
+        pd.DataFrame: Cleaned data sorted by the requested order
+    """
+    float_data = apply_storage_dtypes(float_data.dropna(subset=['latitude', 'longitude', 'date']))
+    
+    float_data = sort_dataset(float_data, sort_order)
+    if sort_order == 'zorder':
+        float_data[ZORDER_KEY_COLUMN] = zorder_key(
+            float_data['latitude'].to_numpy(), float_data['longitude'].to_numpy(), float_data['date'].to_numpy()
+        )
+    return float_data
+
+def apply_storage_dtypes(data):
+    """
+    Convert a consolidated DataFrame to the storage schema.
+    
+    Args:
+        data (pd.DataFrame): Consolidated rows
+        
+    Returns:
+        pd.DataFrame: Rows with compact dtypes and merge artifacts removed
+    """
+    data = data.drop(columns=[column for column in STORAGE_DROP_COLUMNS if column in data.columns])
+    for column, arrow_type in STORAGE_TYPES.items():
+        if column not in data.columns:
+            continue
+        if column == 'float_id':
+            data[column] = data[column].astype(str).astype('category')
+        elif column == 'date':
+            data[column] = pd.to_datetime(data[column]).astype('datetime64[ns]')
+        else:
+            data[column] = pd.to_numeric(data[column], errors='coerce').astype(arrow_type.to_pandas_dtype())
+    return data
+
+def to_storage_table(table):
+    """Cast an Arrow table to the storage schema, dropping merge artifacts"""
+    table = table.drop_columns([column for column in STORAGE_DROP_COLUMNS if column in table.column_names])
+    schema = table.schema
+    for column, arrow_type in STORAGE_TYPES.items():
+        if column in schema.names:
+            schema = schema.set(schema.get_field_index(column), pa.field(column, arrow_type))
+    return table.cast(schema)
+
+def read_sort_order(path):
+    """Return the sort order recorded in a consolidated parquet file"""
+    metadata = pq.read_schema(path).metadata or {}
+    return metadata.get(SORT_ORDER_METADATA_KEY, b'date').decode()
+
+class SortedRunWriter:
+    """
+    Appends date-sorted batches to a staging parquet file as row groups.
+    
+    Each write becomes one sorted run; runs are later combined into a single
+    globally ordered file by merge_sorted_runs.
+    """
+    
+    def __init__(self, path, batch_rows=STREAM_BATCH_ROWS, schema=None):
+        self.path = path
+        self.batch_rows = batch_rows
+        self.schema = schema
+        self.runs = []
+        self._writer = None
+        self._row_groups = 0
+        self._run_start = None
+    
+    def _to_table(self, data):
+        """Convert a DataFrame or Arrow table to the staging schema"""
+        if isinstance(data, pd.DataFrame):
+            data = pa.Table.from_pandas(data, preserve_index=False)
+        data = to_storage_table(data)
+        
+        # Float ids are staged as plain strings and dictionary-encoded on output
+        if 'float_id' in data.column_names:
+            index = data.schema.get_field_index('float_id')
+            data = data.set_column(index, 'float_id', data.column('float_id').cast(pa.string()))
+        
+        if self.schema is None:
+            self.schema = data.schema.remove_metadata()
+        return data.select(self.schema.names).cast(self.schema)
+    
+    def begin_run(self):
+        """Start a run that may span several append calls"""
+        self._run_start = self._row_groups
+    
+    def append(self, data):
+        """Append a batch to the currently open run"""
+        table = self._to_table(data)
+        if table.num_rows == 0:
+            return
+        
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, self.schema, compression='snappy')
+        self._writer.write_table(table, row_group_size=self.batch_rows)
+        self._row_groups += -(-table.num_rows // self.batch_rows)
+    
+    def end_run(self):
+        """Close the currently open run"""
+        if self._row_groups > self._run_start:
+            self.runs.append((self.path, list(range(self._run_start, self._row_groups))))
+        self._run_start = None
+    
+    def write_run(self, data):
+        """Write a complete sorted batch as its own run"""
+        self.begin_run()
+        self.append(data)
+        self.end_run()
+    
+    def close(self):
+        """Flush the staging file"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+def _iter_run_tables(run):
+    """Yield the row groups of a sorted run one at a time"""
+    path, row_groups = run
+    parquet_file = pq.ParquetFile(path)
+    for row_group in row_groups:
+        yield parquet_file.read_row_group(row_group)
+
+def _merge_run_tables(runs, sort_key):
+    """
+    K-way merge of sorted runs with vectorized batch steps.
+    
+    Every step emits all buffered rows whose key is <= the smallest buffer
+    tail key. Rows still to come from any run cannot sort before that cutoff,
+    so the emitted chunks are globally ordered while only one row group per
+    run is held in memory.
+    """
+    iterators = [_iter_run_tables(run) for run in runs]
+    buffers = [None] * len(runs)
+    
+    while True:
+        for i, iterator in enumerate(iterators):
+            while iterator is not None and (buffers[i] is None or buffers[i].num_rows == 0):
+                buffers[i] = next(iterator, None)
+                if buffers[i] is None:
+                    iterators[i] = iterator = None
+        
+        active = [i for i, buffer in enumerate(buffers) if buffer is not None and buffer.num_rows]
+        if not active:
+            return
+        
+        keys = {i: buffers[i].column(sort_key).to_numpy() for i in active}
+        cutoff = min(keys[i][-1] for i in active)
+        
+        taken = []
+        for i in active:
+            split = int(np.searchsorted(keys[i], cutoff, side='right'))
+            if split:
+                taken.append(buffers[i].slice(0, split))
+                buffers[i] = buffers[i].slice(split)
+        
+        merged = pa.concat_tables(taken)
+        yield merged.take(pc.sort_indices(merged, sort_keys=[(sort_key, 'ascending')]))
+
+def merge_sorted_runs(runs, output_path, schema, staging_dir, sort_key='date',
+                      fan_in=MERGE_FAN_IN, batch_rows=STREAM_BATCH_ROWS, drop_columns=(), metadata=None):
+    """
+    Externally merge sorted runs into a single ordered parquet file.
+    
+    When there are more runs than fan_in, intermediate passes merge groups of
+    runs into new staging files until a single final pass remains.
+    
+    Args:
+        runs (list): (path, row_group_indices) tuples, each sorted by sort_key
+        output_path (str): Destination parquet file
+        schema (pa.Schema): Staging schema shared by all runs
+        staging_dir (str): Directory for intermediate merge files
+        sort_key (str): Column defining the global order
+        fan_in (int): Maximum number of runs merged at once
+        batch_rows (int): Target rows per output row group
+        drop_columns (tuple): Helper columns (e.g. the sort key) left out of the output
+        metadata (dict): Key-value metadata stored in the output schema
+        
+    Returns:
+        int: Number of rows written
+    """
+    merge_pass = 0
+    while len(runs) > fan_in:
+        pass_writer = SortedRunWriter(os.path.join(staging_dir, f"merge-{merge_pass}.parquet"),
+                                      batch_rows, schema=schema)
+        for start in range(0, len(runs), fan_in):
+            pass_writer.begin_run()
+            for table in _merge_run_tables(runs[start:start + fan_in], sort_key):
+                pass_writer.append(table)
+            pass_writer.end_run()
+        pass_writer.close()
+        
+        logger.info(f"Merge pass {merge_pass}: {len(runs)} runs -> {len(pass_writer.runs)} runs")
+        runs = pass_writer.runs
+        merge_pass += 1
+    
+    output_schema = pa.schema([field for field in schema if field.name not in drop_columns], metadata=metadata)
+    if 'float_id' in output_schema.names:
+        index = output_schema.get_field_index('float_id')
+        output_schema = output_schema.set(index, pa.field('float_id', pa.dictionary(pa.int32(), pa.string())))
+    
+    total_rows = 0
+    pending = []
+    pending_rows = 0
+    
+    def write(table):
+        table = table.select(output_schema.names)
+        if 'float_id' in table.column_names:
+            index = table.schema.get_field_index('float_id')
+            table = table.set_column(index, output_schema.field('float_id'),
+                                     pc.dictionary_encode(table.column('float_id').combine_chunks()))
+        writer.write_table(table.cast(output_schema), row_group_size=batch_rows)
+    
+    with pq.ParquetWriter(output_path, output_schema, compression='snappy') as writer:
+        for table in _merge_run_tables(runs, sort_key):
+            pending.append(table)
+            pending_rows += table.num_rows
+            total_rows += table.num_rows
+            
+            # Write whole row groups and carry the remainder into the next chunk
+            if pending_rows >= batch_rows:
+                combined = pa.concat_tables(pending)
+                full_rows = pending_rows - pending_rows % batch_rows
+                write(combined.slice(0, full_rows))
+                pending = [combined.slice(full_rows)]
+                pending_rows -= full_rows
+        if pending_rows:
+            write(pa.concat_tables(pending))
+    
+    return total_rows
+
+def log_parquet_summary(output_path):
+    """Log dataset statistics from parquet footer metadata without reading rows"""
+    metadata = pq.ParquetFile(output_path).metadata
+    schema = metadata.schema.to_arrow_schema()
+    
+    logger.info("=== Consolidation Complete ===")
+    logger.info(f"Total records: {metadata.num_rows:,}")
+    logger.info(f"Row groups: {metadata.num_row_groups}")
+    logger.info(f"Columns: {schema.names}")
+    logger.info(f"File size: {os.path.getsize(output_path) / (1024*1024):.2f} MB")
+    
+    print("\n=== Parameter Statistics ===")
+    for param in ['temperature', 'salinity', 'pressure']:
+        if param not in schema.names:
+            continue
+        column = schema.get_field_index(param)
+        null_count = 0
+        for row_group in range(metadata.num_row_groups):
+            statistics = metadata.row_group(row_group).column(column).statistics
+            if statistics is not None and statistics.has_null_count:
+                null_count += statistics.null_count
+        print(f"{param.capitalize()}: {metadata.num_rows - null_count:,} measurements")
+
+def _write_derived_outputs(output_path, float_paths, workers=1, partition_dir=None, profile_store_path=None,
+                           batch_rows=STREAM_BATCH_ROWS, only_missing=False, cube_path=None):
+    """
+    Write the outputs derived from a finished consolidation.
+    
+    Args:
+        output_path (str): Consolidated parquet file
+        float_paths (list): Paths of all float directories
+        workers (int): Number of worker processes
+        partition_dir (str): Hive-partitioned dataset directory, if requested
+        profile_store_path (str): Profile store file, if requested
+        batch_rows (int): Rows per row group for the partitioned dataset
+        only_missing (bool): Only create outputs that do not exist yet or were
+            derived from another version of the file
+        cube_path (str): Aggregate cube file, if requested
+    """
+    if partition_dir:
+        if not (only_missing and partitioned_dataset_is_current(partition_dir, output_path)):
+            write_partitioned_dataset(output_path, partition_dir, batch_rows=batch_rows)
+    else:
+        # A partitioned copy left by an earlier run, where the app looks for it, holds older rows
+        stale_dir = os.path.splitext(output_path)[0]
+        if (os.path.exists(os.path.join(stale_dir, '_common_metadata'))
+                and not partitioned_dataset_is_current(stale_dir, output_path)):
+            shutil.rmtree(stale_dir)
+            logger.info(f"Removed partitioned dataset {stale_dir}, written from an earlier version of the dataset")
+    
+    manifest = load_manifest(get_manifest_path(output_path))
+    if profile_store_path:
+        sources = profile_store_sources(float_paths, manifest)
+        if not (only_missing and profile_store_is_current(profile_store_path, sources)):
+            build_profile_store(float_paths, profile_store_path, workers=workers, sources=sources)
+    else:
+        # A store left by an earlier run, where QueryEngine looks for it, may hold outdated profiles
+        stale_store = os.path.join(os.path.dirname(output_path), PROFILE_STORE_FILE_NAME)
+        if (os.path.exists(stale_store)
+                and not profile_store_is_current(stale_store, profile_store_sources(float_paths, manifest))):
+            os.remove(stale_store)
+            logger.info(f"Removed profile store {stale_store}, built from earlier profile files")
+    
+    if cube_path:
+        if not (only_missing and aggregate_cube_is_current(cube_path, output_path)):
+            build_aggregate_cube(output_path, cube_path, batch_rows=batch_rows)
+    else:
+        # A cube left by an earlier run describes another version of the dataset
+        stale_cube = os.path.join(os.path.dirname(output_path), CUBE_FILE_NAME)
+        if os.path.exists(stale_cube) and not aggregate_cube_is_current(stale_cube, output_path):
+            os.remove(stale_cube)
+            logger.info(f"Removed aggregate cube {stale_cube}, built from an earlier version of the dataset")
+
+def consolidate_data(data_root_dir, output_path, workers=1, incremental=False, streaming=False,
+                     partition_dir=None, row_group_size=None, sort_order='date', profile_store_path=None,
+                     cube_path=None):
     """
     Consolidate all float data into a single master dataset.
     
+    In incremental mode the manifest written next to output_path is compared
+    with the current source files, only new or changed floats are reloaded,
+    and their rows replace the matching float_id rows of the existing output.
+    
+    In streaming mode each float is cleaned, sorted and appended to a staging
+    file as soon as it is loaded, and the output is produced by an external
+    merge of those sorted runs, so peak memory no longer grows with the size
+    of the archive.
+    
     Args:
         data_root_dir (str): Root directory containing float data
         output_path (str): Path to save the consolidated dataset
+        workers (int): Number of worker processes used to load floats
+        incremental (bool): Reprocess only floats whose sources changed
+        streaming (bool): Write through sorted runs instead of one in-memory concat
+        partition_dir (str): Also write a hive-partitioned copy of the output here
+        row_group_size (int): Rows per parquet row group (default: writer default,
+            STREAM_BATCH_ROWS when streaming)
+        sort_order (str): 'date', or 'zorder' to cluster rows along a Z-order
+            curve over time/lat/lon so row group statistics stay selective for
+            bounding-box filters
+        profile_store_path (str): Also pack full_profile_data.parquet of every
+            float into a profile store at this path
+        cube_path (str): Also precompute the aggregate cube at this path
+        
+    Returns:
+        pd.DataFrame: The master dataset (None in streaming mode)
     """
     logger.info("Starting data consolidation process...")
     
+    if sort_order not in SORT_ORDERS:
+        raise ValueError(f"Unknown sort order '{sort_order}', expected one of {SORT_ORDERS}")
+    
     all_data = []
     processed_floats = 0
     
@@ -78,19 +1185,93 @@ def consolidate_data(data_root_dir, output_path):
         logger.error(f"Data directory not found: {data_dir}")
         return
     
-    # Process each float directory
-    for item in os.listdir(data_dir):
-        float_path = os.path.join(data_dir, item)
+    float_paths = list_float_dirs(data_dir)
+    logger.info(f"Found {len(float_paths)} float directories (workers: {workers})")
+    
+    manifest_path = get_manifest_path(output_path)
+    previous_manifest = load_manifest(manifest_path)
+    current_manifest = {}
+    stale_floats = set()
+    
+    for float_path in float_paths:
+        float_id = os.path.basename(float_path)
+        current_manifest[float_id] = fingerprint_float(float_path, previous_manifest.get(float_id))
+    
+    if incremental and os.path.exists(output_path) and read_sort_order(output_path) != sort_order:
+        logger.info(f"Existing output is not sorted by '{sort_order}', running a full consolidation")
+        previous_manifest = {}
+    
+    if incremental and previous_manifest and os.path.exists(output_path):
+        to_process = [
+            float_path for float_path in float_paths
+            if not _same_content(previous_manifest.get(os.path.basename(float_path)),
+                                 current_manifest[os.path.basename(float_path)])
+        ]
+        stale_floats = set(previous_manifest) - set(current_manifest)
         
-        if os.path.isdir(float_path):
-            logger.info(f"Processing float: {item}")
-            float_data = load_float_data(float_path)
+        if not to_process and not stale_floats:
+            logger.info("All floats are up to date, nothing to consolidate")
+            save_manifest(manifest_path, current_manifest)
+            _write_derived_outputs(output_path, float_paths, workers, partition_dir, profile_store_path,
+                                   batch_rows=row_group_size or STREAM_BATCH_ROWS, only_missing=True,
+                                   cube_path=cube_path)
+            return None if streaming else pd.read_parquet(output_path)
+        
+        logger.info(f"Incremental run: {len(to_process)} new or changed floats, "
+                    f"{len(stale_floats)} removed floats")
+        reuse_existing = True
+    else:
+        if incremental:
+            logger.info("No previous manifest or output found, running a full consolidation")
+        to_process = float_paths
+        reuse_existing = False
+    
+    if streaming:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        staging_dir = tempfile.mkdtemp(prefix='consolidation-', dir=os.path.dirname(output_path))
+        run_writer = SortedRunWriter(os.path.join(staging_dir, 'runs.parquet'),
+                                     batch_rows=row_group_size or STREAM_BATCH_ROWS)
+    
+    try:
+        # Process each float directory
+        for float_path, float_data in iter_float_data(to_process, workers=workers):
+            float_id = os.path.basename(float_path)
             
             if float_data is not None:
-                all_data.append(float_data)
+                if streaming:
+                    run_writer.write_run(clean_float_batch(float_data, sort_order))
+                else:
+                    all_data.append(float_data)
+                stale_floats.add(float_id)
                 processed_floats += 1
             else:
-                logger.warning(f"Skipped float: {item}")
+                logger.warning(f"Skipped float: {float_id}")
+                # Keep the rows and manifest entry of a float that loaded before,
+                # so a transient failure is retried instead of dropping its data
+                if float_id in previous_manifest and reuse_existing:
+                    current_manifest[float_id] = previous_manifest[float_id]
+                else:
+                    # No rows of it are written, so the next incremental run must load it again
+                    current_manifest.pop(float_id, None)
+        
+        if streaming:
+            _finish_streaming(run_writer, staging_dir, output_path, manifest_path,
+                              current_manifest, stale_floats if reuse_existing else None, sort_order)
+            if os.path.exists(output_path):
+                _write_derived_outputs(output_path, float_paths, workers, partition_dir, profile_store_path,
+                                       batch_rows=run_writer.batch_rows, cube_path=cube_path)
+            return
+    finally:
+        if streaming:
+            run_writer.close()
+            shutil.rmtree(staging_dir, ignore_errors=True)
+    
+    if reuse_existing:
+        existing_data = pd.read_parquet(output_path)
+        # Keep rows of untouched floats; reloaded and removed floats are replaced
+        keep_mask = ~existing_data['float_id'].astype(str).isin(stale_floats)
+        logger.info(f"Reusing {int(keep_mask.sum()):,} existing records")
+        all_data.insert(0, existing_data[keep_mask])
     
     if not all_data:
         logger.error("No data found to consolidate")
@@ -106,19 +1287,24 @@ def consolidate_data(data_root_dir, output_path):
     # Remove rows with missing critical data
     master_dataset = master_dataset.dropna(subset=['latitude', 'longitude', 'date'])
     
-    # Sort by date for better performance
-    master_dataset = master_dataset.sort_values('date')
+    # Optimize data types (float32 measurements/positions, int32 profile ids, dictionary float ids)
+    master_dataset = apply_storage_dtypes(master_dataset)
+    master_dataset['float_id'] = master_dataset['float_id'].cat.remove_unused_categories()
     
-    # Optimize data types
-    master_dataset['float_id'] = master_dataset['float_id'].astype('category')
-    master_dataset['pressure'] = pd.to_numeric(master_dataset['pressure'], errors='coerce')
-    master_dataset['temperature'] = pd.to_numeric(master_dataset['temperature'], errors='coerce')
-    master_dataset['salinity'] = pd.to_numeric(master_dataset['salinity'], errors='coerce')
+    # Sort by date (or along the Z-order curve) for better performance
+    master_dataset = sort_dataset(master_dataset, sort_order).reset_index(drop=True)
     
     # Save the consolidated dataset
     logger.info(f"Saving master dataset to {output_path}")
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    master_dataset.to_parquet(output_path, compression='snappy')
+    table = to_storage_table(pa.Table.from_pandas(master_dataset, preserve_index=False))
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           SORT_ORDER_METADATA_KEY: sort_order.encode()})
+    pq.write_table(table, output_path, compression='snappy', row_group_size=row_group_size)
+    save_manifest(manifest_path, current_manifest)
+    
+    _write_derived_outputs(output_path, float_paths, workers, partition_dir, profile_store_path,
+                           batch_rows=row_group_size or STREAM_BATCH_ROWS, cube_path=cube_path)
     
     # Print summary statistics
     logger.info("=== Consolidation Complete ===")
@@ -137,19 +1323,186 @@ def consolidate_data(data_root_dir, output_path):
     
     return master_dataset
 
+def _add_partition_columns(batch, cell_degrees):
+    """Derive the hive partition keys for a record batch"""
+    dates = batch.column('date')
+    
+    def cell(values):
+        return pc.multiply(pc.floor(pc.divide(pc.cast(values, pa.float64()), cell_degrees)),
+                           cell_degrees).cast(pa.int16())
+    
+    arrays = batch.columns + [
+        pc.year(dates).cast(pa.int16()),
+        pc.month(dates).cast(pa.int8()),
+        cell(batch.column('latitude')),
+        cell(batch.column('longitude')),
+    ]
+    return pa.RecordBatch.from_arrays(arrays, names=batch.schema.names + PARTITION_COLUMNS)
+
+def write_partitioned_dataset(source_path, partition_dir, cell_degrees=PARTITION_CELL_DEGREES,
+                              batch_rows=STREAM_BATCH_ROWS):
+    """
+    Rewrite a consolidated parquet file as a hive-partitioned dataset.
+    
+    Partitions are keyed by year, month and a coarse lat/lon cell, e.g.
+    year=2016/month=3/lat_cell=10/lon_cell=60, so readers can prune whole
+    directories by period and region. The source is streamed batch by batch
+    and the new dataset replaces the old one only once it is complete.
+    
+    Args:
+        source_path (str): Consolidated parquet file to partition
+        partition_dir (str): Output dataset directory
+        cell_degrees (int): Size of the lat/lon partition cells in degrees
+        batch_rows (int): Rows per scanned batch and maximum rows per row group
+    """
+    signature = file_signature(source_path)
+    source = pq.ParquetFile(source_path)
+    columns = [name for name in source.schema_arrow.names if not name.startswith('__index_level_')]
+    
+    batches = (
+        _add_partition_columns(batch, cell_degrees)
+        for batch in source.iter_batches(batch_size=batch_rows, columns=columns)
+    )
+    first = next(batches, None)
+    if first is None:
+        logger.error(f"No rows to partition in {source_path}")
+        return
+    
+    def all_batches():
+        yield first
+        yield from batches
+    
+    reader = pa.RecordBatchReader.from_batches(first.schema, all_batches())
+    partitioning = ds.partitioning(
+        pa.schema([first.schema.field(name) for name in PARTITION_COLUMNS]), flavor='hive'
+    )
+    
+    tmp_dir = f"{partition_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    
+    logger.info(f"Writing partitioned dataset to {partition_dir} ({cell_degrees}° cells)")
+    ds.write_dataset(
+        reader,
+        tmp_dir,
+        format='parquet',
+        partitioning=partitioning,
+        basename_template='part-{i}.parquet',
+        max_partitions=100000,
+        max_rows_per_group=batch_rows,
+        existing_data_behavior='overwrite_or_ignore',
+    )
+    
+    # Record the cell size so readers can translate bounds into cell keys, and the
+    # source file, so readers can match the outputs derived from the same file
+    data_schema = pa.schema([field for field in first.schema if field.name not in PARTITION_COLUMNS])
+    pq.write_metadata(data_schema.with_metadata({
+        PARTITION_METADATA_KEY: str(cell_degrees).encode(),
+        SOURCE_SIGNATURE_KEY: json.dumps(signature).encode(),
+    }), os.path.join(tmp_dir, '_common_metadata'))
+    
+    shutil.rmtree(partition_dir, ignore_errors=True)
+    os.replace(tmp_dir, partition_dir)
+    
+    partition_count = sum(1 for _, _, files in os.walk(partition_dir) if any(f.endswith('.parquet') for f in files))
+    logger.info(f"Partitioned dataset written: {partition_count} partitions")
+
+def _finish_streaming(run_writer, staging_dir, output_path, manifest_path, manifest, stale_floats=None,
+                      sort_order='date'):
+    """
+    Merge the staged runs of a streaming consolidation into the output file.
+    
+    Args:
+        run_writer (SortedRunWriter): Writer holding one sorted run per float
+        staging_dir (str): Directory for intermediate merge files
+        output_path (str): Destination parquet file
+        manifest_path (str): Manifest to update after a successful write
+        manifest (dict): Fingerprints of the floats in the new output
+        stale_floats (set): Float ids to drop when reusing the existing output,
+            or None for a full rebuild
+        sort_order (str): 'date' or 'zorder'
+    """
+    if stale_floats is not None:
+        # The existing output is already in sort order, so its surviving rows form one run
+        run_writer.begin_run()
+        reused = 0
+        existing_file = pq.ParquetFile(output_path)
+        columns = [name for name in existing_file.schema_arrow.names if not name.startswith('__index_level_')]
+        for batch in existing_file.iter_batches(batch_size=run_writer.batch_rows, columns=columns):
+            table = pa.Table.from_batches([batch])
+            float_ids = table.column('float_id').cast(pa.string())
+            keep = pc.invert(pc.is_in(float_ids, value_set=pa.array(sorted(stale_floats), pa.string())))
+            # Outputs written before the storage schema are converted on the way through
+            table = to_storage_table(table.filter(keep))
+            if sort_order == 'zorder':
+                keys = zorder_key(table.column('latitude').to_numpy(), table.column('longitude').to_numpy(),
+                                  table.column('date').to_numpy())
+                table = table.append_column(ZORDER_KEY_COLUMN, pa.array(keys, pa.uint64()))
+            reused += table.num_rows
+            run_writer.append(table)
+        run_writer.end_run()
+        logger.info(f"Reusing {reused:,} existing records")
+    
+    run_writer.close()
+    
+    if not run_writer.runs:
+        logger.error("No data found to consolidate")
+        return
+    
+    logger.info(f"Merging {len(run_writer.runs)} sorted runs into {output_path}")
+    tmp_output = os.path.join(staging_dir, 'output.parquet')
+    sort_key = ZORDER_KEY_COLUMN if sort_order == 'zorder' else 'date'
+    merge_sorted_runs(run_writer.runs, tmp_output, run_writer.schema, staging_dir, sort_key=sort_key,
+                      batch_rows=run_writer.batch_rows, drop_columns=(ZORDER_KEY_COLUMN,),
+                      metadata={SORT_ORDER_METADATA_KEY: sort_order.encode()})
+    os.replace(tmp_output, output_path)
+    save_manifest(manifest_path, manifest)
+    
+    log_parquet_summary(output_path)
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Consolidate ARGO float data into the FloatChat master dataset")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of worker processes used to load floats (default: 1, serial)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only reprocess floats whose source files changed since the last run")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Stream floats through sorted runs and an external merge to bound memory")
+    parser.add_argument('--partitioned', action='store_true',
+                        help="Also write a hive-partitioned dataset (year/month/lat_cell/lon_cell)")
+    parser.add_argument('--profile-store', action='store_true',
+                        help="Also pack full_profile_data.parquet into processed_data/profile_store.parquet")
+    parser.add_argument('--aggregate-cube', action='store_true',
+                        help="Also precompute processed_data/aggregate_cube.parquet for fast statistics")
+    parser.add_argument('--row-group-size', type=int, default=None,
+                        help="Rows per parquet row group")
+    parser.add_argument('--sort-order', choices=SORT_ORDERS, default='date',
+                        help="Output ordering: date, or zorder to cluster rows by time/lat/lon for predicate pushdown")
+    return parser.parse_args()
+
 def main():
     """Main execution function"""
+    args = parse_args()
+    
     # Define paths
     project_root = Path(__file__).parent.parent
     data_root = project_root / 'data'
     output_path = project_root / 'processed_data' / 'master_dataset.parquet'
+    partition_dir = project_root / 'processed_data' / 'master_dataset' if args.partitioned else None
+    profile_store_path = project_root / 'processed_data' / PROFILE_STORE_FILE_NAME if args.profile_store else None
+    cube_path = project_root / 'processed_data' / CUBE_FILE_NAME if args.aggregate_cube else None
     
     logger.info(f"Project root: {project_root}")
     logger.info(f"Data root: {data_root}")
     logger.info(f"Output path: {output_path}")
     
     # Run consolidation
-    consolidate_data(str(data_root), str(output_path))
+    consolidate_data(str(data_root), str(output_path), workers=args.workers,
+                     incremental=args.incremental, streaming=args.streaming,
+                     partition_dir=str(partition_dir) if partition_dir else None,
+                     row_group_size=args.row_group_size, sort_order=args.sort_order,
+                     profile_store_path=str(profile_store_path) if profile_store_path else None,
+                     cube_path=str(cube_path) if cube_path else None)
 
 if __name__ == "__main__":
     main()